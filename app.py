@@ -5,9 +5,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from logging_setup import configure_logging
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (nível e formato via LOG_LEVEL, LOG_LEVELS e LOG_FORMAT)
+configure_logging()
 
 class Base(DeclarativeBase):
     pass
@@ -21,9 +22,50 @@ def load_user(user_id):
     from models import User
     return User.query.get(int(user_id))
 
+def upgrade_schema():
+    """Adiciona colunas e índices novos dos modelos a tabelas já existentes (create_all não altera tabelas)"""
+    from sqlalchemy import inspect, text
+    
+    inspector = inspect(db.engine)
+    tabelas = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in tabelas:
+                continue
+            existentes = {col['name'] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existentes and column.nullable:
+                    tipo = column.type.compile(dialect=db.engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {tipo}'))
+                    logging.info(f"Coluna adicionada: {table.name}.{column.name}")
+            # create_all também não cria índices novos em tabelas existentes
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
+def init_sqlite_engine(app):
+    """Aplica os PRAGMAs de concorrência a cada conexão nova do banco da aplicação"""
+    from sqlalchemy import event
+    
+    pragmas = (
+        f"busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}",
+        f"journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+        f"synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+    )
+    
+    @event.listens_for(db.engine, 'connect')
+    def _configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
 def create_app():
     app = Flask(__name__)
     
+    # JSON com suporte nativo a numpy/pandas (orjson quando disponível)
+    from json_provider import SAVIJSONProvider
+    app.json = SAVIJSONProvider(app)
+    
     # Configuration
     app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
     
@@ -37,11 +79,71 @@ def create_app():
     
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # Banco compartilhado pelos workers: WAL (leituras não bloqueiam escritas), espera por locks e pool
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 10000))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'connect_args': {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000},
+        'pool_size': int(os.environ.get('SQLALCHEMY_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('SQLALCHEMY_POOL_RECYCLE', 3600)),
+    }
     app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
     app.config['UPLOAD_FOLDER'] = 'uploads'
     
+    # Resultados processados de cada sessão em arquivo próprio (deletar a sessão remove o arquivo)
+    app.config['SESSION_STORE_FOLDER'] = os.environ.get(
+        'SESSION_STORE_FOLDER', os.path.join(os.getcwd(), 'instance', 'sessions'))
+    
+    # Limpeza da pasta de uploads em segundo plano (arquivos usados por sessões nunca são removidos)
+    app.config['UPLOAD_JANITOR_ENABLED'] = os.environ.get('UPLOAD_JANITOR_ENABLED', '1') == '1'
+    app.config['UPLOAD_JANITOR_INTERVAL_SECONDS'] = float(os.environ.get('UPLOAD_JANITOR_INTERVAL_SECONDS', 900))
+    app.config['UPLOAD_QUOTA_BYTES'] = int(os.environ.get('UPLOAD_QUOTA_BYTES', 10 * 1024 * 1024 * 1024))
+    app.config['UPLOAD_MAX_IDLE_HOURS'] = float(os.environ.get('UPLOAD_MAX_IDLE_HOURS', 24))
+    app.config['UPLOAD_GRACE_SECONDS'] = float(os.environ.get('UPLOAD_GRACE_SECONDS', 3600))
+    
+    # Validação dos arquivos enviados (PRAGMA quick_check é opcional: lê o banco inteiro)
+    app.config['UPLOAD_QUICK_CHECK'] = os.environ.get('UPLOAD_QUICK_CHECK', '0') == '1'
+    
+    # Upload em partes (retomável) para arquivos acima do MAX_CONTENT_LENGTH
+    app.config['CHUNKED_UPLOAD_CHUNK_SIZE'] = int(os.environ.get('CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    app.config['CHUNKED_UPLOAD_MAX_SIZE'] = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024))
+    
+    # Listagens de sessões (paginação por cursor)
+    app.config['SESSIONS_PER_PAGE'] = int(os.environ.get('SESSIONS_PER_PAGE', 50))
+    app.config['DASHBOARD_SESSION_OPTIONS'] = int(os.environ.get('DASHBOARD_SESSION_OPTIONS', 50))
+    
+    # Análise consolidada de várias sessões (união deduplicada via ATTACH)
+    app.config['CONSOLIDATED_MAX_SESSIONS'] = int(os.environ.get('CONSOLIDATED_MAX_SESSIONS', 24))
+    
+    # Log de requisições lentas (buffer circular em disco)
+    app.config['SLOW_REQUEST_THRESHOLD_MS'] = float(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 2000))
+    app.config['SLOW_REQUEST_LOG_PATH'] = os.environ.get(
+        'SLOW_REQUEST_LOG_PATH', os.path.join(os.getcwd(), 'instance', 'slow_requests.log'))
+    app.config['SLOW_REQUEST_LOG_MAX_ENTRIES'] = int(os.environ.get('SLOW_REQUEST_LOG_MAX_ENTRIES', 500))
+    
+    # Compressão de respostas (gzip/brotli)
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+    app.config['COMPRESS_STREAMS'] = os.environ.get('COMPRESS_STREAMS', '1') == '1'
+    app.config['COMPRESS_CACHE_MAX_BYTES'] = int(os.environ.get('COMPRESS_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    
+    # Eventos de status das sessões (SSE / long-polling)
+    app.config['SESSION_EVENTS_KEEPALIVE_SECONDS'] = float(os.environ.get('SESSION_EVENTS_KEEPALIVE_SECONDS', 15))
+    app.config['SESSION_EVENTS_DB_CHECK_SECONDS'] = float(os.environ.get('SESSION_EVENTS_DB_CHECK_SECONDS', 5))
+    app.config['SESSION_EVENTS_MAX_SECONDS'] = float(os.environ.get('SESSION_EVENTS_MAX_SECONDS', 300))
+    
     # Ensure upload directory exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['SESSION_STORE_FOLDER'], exist_ok=True)
+    
+    # Arquivos enviados nunca são alterados: abrir com immutable=1 e pool de conexões
+    from sqlite_pool import register_immutable_dir
+    register_immutable_dir(app.config['UPLOAD_FOLDER'])
+    register_immutable_dir(app.config['SESSION_STORE_FOLDER'])
     
     # Initialize extensions
     db.init_app(app)
@@ -50,13 +152,27 @@ def create_app():
     login_manager.login_message = 'Por favor, faça login para acessar esta página.'
     login_manager.login_message_category = 'info'
     
+    # Registrar requisições acima do limite com contexto do pipeline
+    from profiling import init_slow_request_log
+    init_slow_request_log(app)
+    
+    # Comprimir respostas grandes e streams
+    from compression import init_compression
+    init_compression(app)
+    
+    # Limpeza de uploads fora do caminho das requisições
+    from upload_janitor import init_upload_janitor
+    init_upload_janitor(app)
+    
     # ProxyFix for proper URL generation
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
     
     # Create database tables
     with app.app_context():
+        init_sqlite_engine(app)
         import models
         db.create_all()
+        upgrade_schema()
         
         # Create default admin user if it doesn't exist
         from models import User
@@ -0,0 +1,193 @@
+"""
+Processamento em lote (sem Flask) dos arquivos de produção SAVI
+
+Uso:
+    python batch_runner.py producao_2024-01.db producao_2024-02.db --excel carteirinhas.xlsx -o saida/
+    python batch_runner.py exports/ -o saida/ --format parquet --workers 8
+
+Diretórios são varridos por arquivos .db/.sqlite/.sqlite3; uma planilha com o mesmo
+nome-base (ex.: producao_2024-01.xlsx) tem precedência sobre --excel.
+
+Este módulo não importa Flask nem SQLAlchemy para iniciar rápido via cron.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+DB_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+FORMATS = ('json', 'csv', 'parquet')
+
+
+def _json_default(value):
+    """Converte escalares numpy/pandas para tipos nativos do JSON"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def discover_jobs(inputs, default_excel=None):
+    """Expande arquivos e diretórios em pares (db_path, excel_path)"""
+    jobs = []
+    for item in inputs:
+        if os.path.isdir(item):
+            nomes = sorted(os.listdir(item))
+            for nome in nomes:
+                if not nome.lower().endswith(DB_EXTENSIONS):
+                    continue
+                base = os.path.splitext(nome)[0]
+                excel = next((os.path.join(item, base + ext) for ext in EXCEL_EXTENSIONS
+                              if os.path.exists(os.path.join(item, base + ext))), default_excel)
+                jobs.append((os.path.join(item, nome), excel))
+        elif os.path.isfile(item):
+            jobs.append((item, default_excel))
+        else:
+            raise FileNotFoundError(f"Arquivo ou diretório não encontrado: {item}")
+    return jobs
+
+
+def _write_table(df, path_base, fmt):
+    if fmt == 'csv':
+        df.to_csv(path_base + '.csv', index=False)
+    elif fmt == 'parquet':
+        df.to_parquet(path_base + '.parquet', index=False)
+    else:
+        with open(path_base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(df.to_dict('records'), f, ensure_ascii=False, indent=2, default=_json_default)
+
+
+def write_outputs(resultado, destino, fmt):
+    """Grava resumos, pacotes, inconsistências e perfil de qualidade de um resultado de process_faturamento"""
+    import pandas as pd
+
+    os.makedirs(destino, exist_ok=True)
+    resumos = {k: v for k, v in resultado.items() if k.startswith('resumo_')}
+
+    if fmt == 'json':
+        with open(os.path.join(destino, 'resumos.json'), 'w', encoding='utf-8') as f:
+            json.dump(resumos, f, ensure_ascii=False, indent=2, default=_json_default)
+    else:
+        for nome, resumo in resumos.items():
+            if nome == 'resumo_financeiro':
+                df = pd.DataFrame([resumo])
+            else:
+                df = pd.DataFrame.from_dict(resumo, orient='index')
+                df.index.name = 'chave'
+                df = df.reset_index()
+            _write_table(df, os.path.join(destino, nome), fmt)
+
+    pacotes = pd.DataFrame(resultado['pacotes_aplicados'])
+    if fmt == 'csv' and not pacotes.empty:
+        pacotes['sessoes_ids'] = pacotes['sessoes_ids'].map(lambda ids: ' '.join(map(str, ids)))
+    _write_table(pacotes, os.path.join(destino, 'pacotes'), fmt)
+    _write_table(pd.DataFrame(resultado['inconsistencias']), os.path.join(destino, 'inconsistencias'), fmt)
+
+    # Perfil de qualidade (estrutura aninhada: sempre JSON)
+    with open(os.path.join(destino, 'perfil_qualidade.json'), 'w', encoding='utf-8') as f:
+        json.dump(resultado['perfil_qualidade'], f, ensure_ascii=False, indent=2, default=_json_default)
+
+
+def process_file(db_path, excel_path, output_dir, fmt, parallel_months=False):
+    """Processa um arquivo de produção (executado em processo separado)"""
+    from business_logic import perfil_qualidade
+    from data_processor import SAVIDataProcessor
+
+    inicio = time.perf_counter()
+    processor = SAVIDataProcessor(db_path, excel_path)
+    df_producao = processor.load_data_from_sqlite()
+    if df_producao.empty:
+        raise ValueError(f"Nenhum dado carregado de {db_path}")
+
+    resultado = processor.business_logic.process_faturamento(df_producao, excel_path,
+                                                             parallel=parallel_months)
+    # Perfil de qualidade fica fora do pipeline de faturamento: calculado aqui, uma vez por arquivo
+    resultado['perfil_qualidade'] = perfil_qualidade(df_producao)
+    destino = os.path.join(output_dir, os.path.splitext(os.path.basename(db_path))[0])
+    write_outputs(resultado, destino, fmt)
+
+    financeiro = resultado['resumo_financeiro']
+    return {
+        'db_path': db_path,
+        'excel_path': excel_path,
+        'output': destino,
+        'total_registros': int(financeiro['total_registros']),
+        'total_faturado': float(financeiro['total_faturado']),
+        'total_pacotes': int(financeiro['total_pacotes']),
+        'inconsistencias': len(resultado['inconsistencias']),
+        'segundos': round(time.perf_counter() - inicio, 2),
+    }
+
+
+def _worker_init():
+    from logging_setup import configure_logging
+    configure_logging()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Processamento em lote do faturamento SAVI')
+    parser.add_argument('inputs', nargs='+', help='Arquivos SQLite de produção ou diretórios contendo-os')
+    parser.add_argument('--excel', help='Planilha de carteirinhas especiais usada por padrão')
+    parser.add_argument('-o', '--output', required=True, help='Diretório de saída')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='json', help='Formato das tabelas de saída')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='Processos paralelos')
+    parser.add_argument('--parallel-months', action='store_true',
+                        help='Também paraleliza os meses de cada arquivo (útil com poucos arquivos grandes)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    from logging_setup import configure_logging
+    from utils import format_currency
+    configure_logging()
+
+    if args.format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("Formato parquet requer o pacote pyarrow", file=sys.stderr)
+            return 2
+
+    try:
+        jobs = discover_jobs(args.inputs, args.excel)
+    except FileNotFoundError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    if not jobs:
+        print("Nenhum arquivo de produção encontrado", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    resultados, falhas = [], []
+    workers = max(1, min(args.workers or 1, len(jobs)))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init) as executor:
+        futures = {executor.submit(process_file, db, excel, args.output, args.format, args.parallel_months): db
+                   for db, excel in jobs}
+        for future in as_completed(futures):
+            db_path = futures[future]
+            try:
+                resumo = future.result()
+                resultados.append(resumo)
+                print(f"OK    {db_path}: {resumo['total_registros']} registros, "
+                      f"{format_currency(resumo['total_faturado'])} em {resumo['segundos']}s")
+            except Exception as e:
+                logging.error("Falha ao processar %s: %s", db_path, e)
+                falhas.append({'db_path': db_path, 'erro': str(e)})
+                print(f"ERRO  {db_path}: {e}", file=sys.stderr)
+
+    with open(os.path.join(args.output, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'formato': args.format, 'resultados': sorted(resultados, key=lambda r: r['db_path']),
+                   'falhas': falhas}, f, ensure_ascii=False, indent=2)
+
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
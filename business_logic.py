@@ -5,8 +5,16 @@ Implementa regras de faturamento, pacotes e validações conforme especificaçã
 
 from datetime import datetime
 from collections import defaultdict
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
 import pandas as pd
 import logging
+from profiling import stage
+
+logger = logging.getLogger(__name__)
 
 # Preços dos procedimentos conforme códigos reais do banco (sem pontos e hífens)
 PRECOS_PROCEDIMENTOS = {
@@ -73,6 +81,140 @@ VALIDACAO_PROCEDIMENTOS = {
     ]
 }
 
+# Versão das regras (preços, pacotes e validações): muda sempre que as tabelas acima mudam
+VERSAO_REGRAS = hashlib.sha256(json.dumps(
+    [PRECOS_PROCEDIMENTOS, PROCEDIMENTOS_PACOTE, PACOTE_COMUM, PACOTE_ESPECIAL, VALIDACAO_PROCEDIMENTOS],
+    sort_keys=True).encode()).hexdigest()[:12]
+
+# Colunas de produção cujos valores distintos alimentam os filtros do relatório geral
+COLUNAS_FILTRO = {
+    'empresas': 'empresa',
+    'especialidades': 'procedimento_nome',
+    'medicos': 'medico_nome',
+}
+
+
+def contar_valores_distintos(df_producao):
+    """Valores distintos (ordenados) e contagem de registros das colunas de filtro"""
+    valores = {}
+    for chave, coluna in COLUNAS_FILTRO.items():
+        if coluna not in df_producao.columns:
+            valores[chave] = {}
+            continue
+        contagens = df_producao[coluna].value_counts(dropna=True).sort_index()
+        valores[chave] = {str(valor): int(n) for valor, n in contagens.items()}
+    return valores
+
+
+# Colunas de produção acompanhadas no perfil de qualidade
+COLUNAS_PERFIL = (
+    'empresa', 'data_execucao', 'usuario_codigo', 'usuario_nome', 'medico_nome',
+    'procedimento_codigo', 'procedimento_nome', 'qtde_realizada', 'numero_guia', 'senha',
+)
+MAX_VALORES_PERFIL = 10
+
+
+def _distribuicao(contagens, total, limite=MAX_VALORES_PERFIL):
+    """Maiores valores de uma contagem, com o restante agregado em 'outros' (limite=None: todos, na ordem dada)"""
+    if limite is not None:
+        contagens = contagens.sort_values(ascending=False, kind='mergesort')
+    topo = contagens if limite is None else contagens.head(limite)
+    return {
+        'distintos': int(len(contagens)),
+        'valores': [{'valor': str(valor), 'registros': int(n), 'taxa': round(n / total, 4)}
+                    for valor, n in topo.items()],
+        'outros': int(contagens.iloc[len(topo):].sum()),
+    }
+
+
+def perfil_qualidade(df_producao, valores_distintos=None):
+    """Perfil de qualidade da produção: nulos, datas inválidas, quantidades zeradas, códigos sem preço
+    
+    Operações vetorizadas sobre o DataFrame já carregado; contagens das colunas de filtro
+    são reaproveitadas de valores_distintos quando informadas.
+    """
+    total = len(df_producao)
+    perfil = {'total_registros': total, 'nulos': {}, 'distribuicoes': {}}
+    if total == 0:
+        return perfil
+
+    # Nulos (strings vazias contam como nulas)
+    for coluna in COLUNAS_PERFIL:
+        if coluna not in df_producao.columns:
+            continue
+        serie = df_producao[coluna]
+        nulos = serie.isna()
+        if serie.dtype == object:
+            nulos |= serie.astype(str).str.strip().eq('')
+        n = int(nulos.sum())
+        perfil['nulos'][coluna] = {'registros': n, 'taxa': round(n / total, 4)}
+
+    # Datas fora do formato dd/mm/aaaa
+    if 'data_execucao' in df_producao.columns:
+        preenchidas = df_producao['data_execucao'].notna()
+        datas = pd.to_datetime(df_producao['data_execucao'], format='%d/%m/%Y', errors='coerce')
+        invalidas = int((preenchidas & datas.isna()).sum())
+        perfil['datas_invalidas'] = {'registros': invalidas, 'taxa': round(invalidas / total, 4)}
+        perfil['data_inicio'] = datas.min().strftime('%d/%m/%Y') if datas.notna().any() else None
+        perfil['data_fim'] = datas.max().strftime('%d/%m/%Y') if datas.notna().any() else None
+        meses = datas.dt.to_period('M').astype(str).where(datas.notna())
+        perfil['distribuicoes']['mes'] = _distribuicao(meses.value_counts(dropna=True).sort_index(), total, limite=None)
+
+    # Quantidade realizada ausente, zero ou negativa
+    if 'qtde_realizada' in df_producao.columns:
+        qtde = pd.to_numeric(df_producao['qtde_realizada'], errors='coerce')
+        zeradas = int((qtde.isna() | (qtde <= 0)).sum())
+        perfil['qtde_zerada'] = {'registros': zeradas, 'taxa': round(zeradas / total, 4)}
+
+    # Procedimentos sem preço configurado (valem 0,00 no faturamento)
+    if 'procedimento_codigo' in df_producao.columns:
+        codigos = df_producao['procedimento_codigo'].astype(str)
+        sem_preco = ~codigos.isin(list(PRECOS_PROCEDIMENTOS))
+        contagens = codigos[sem_preco].value_counts()
+        n = int(sem_preco.sum())
+        perfil['sem_preco'] = {'registros': n, 'taxa': round(n / total, 4), 'codigos': _distribuicao(contagens, total)}
+
+    # Distribuição por dimensão
+    valores_distintos = valores_distintos or contar_valores_distintos(df_producao)
+    for chave, coluna in COLUNAS_FILTRO.items():
+        contagens = pd.Series(valores_distintos.get(chave, {}), dtype='int64')
+        perfil['distribuicoes'][coluna] = _distribuicao(contagens, total)
+
+    return perfil
+
+
+class RegistrosProcessados:
+    """
+    Visão preguiçosa sobre o DataFrame processado.
+    
+    len() é O(1); os dicionários por linha só são criados ao iterar (em blocos)
+    ou ao fatiar uma página. O DataFrame fica disponível em .frame.
+    """
+    
+    def __init__(self, frame, chunk_size=10000):
+        self.frame = frame
+        self.chunk_size = chunk_size
+    
+    def __len__(self):
+        return len(self.frame)
+    
+    def __iter__(self):
+        for inicio in range(0, len(self.frame), self.chunk_size):
+            yield from self.frame.iloc[inicio:inicio + self.chunk_size].to_dict('records')
+    
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.frame.iloc[item].to_dict('records')
+        return self.frame.iloc[item].to_dict()
+    
+    def pagina(self, numero, por_pagina):
+        """Registros da página (1-based)"""
+        inicio = (max(numero, 1) - 1) * por_pagina
+        return self[inicio:inicio + por_pagina]
+    
+    def to_list(self):
+        return self.frame.to_dict('records')
+
 class SAVIBusinessLogic:
     def __init__(self):
         self.carteirinhas_especiais = set()
@@ -84,11 +226,11 @@ class SAVIBusinessLogic:
                 df = pd.read_excel(excel_path)
                 if 'usuario_codigo' in df.columns:
                     self.carteirinhas_especiais = set(df['usuario_codigo'].astype(str))
-                    logging.info(f"Carregadas {len(self.carteirinhas_especiais)} carteirinhas especiais")
+                    logger.info("Carregadas %d carteirinhas especiais", len(self.carteirinhas_especiais))
                 else:
-                    logging.warning("Coluna 'usuario_codigo' não encontrada no Excel")
+                    logger.warning("Coluna 'usuario_codigo' não encontrada no Excel")
             except Exception as e:
-                logging.error(f"Erro ao carregar carteirinhas especiais: {e}")
+                logger.error("Erro ao carregar carteirinhas especiais: %s", e)
     
     def calcular_valor_procedimento(self, procedimento_codigo, usuario_codigo, medico_nome=None):
         """Calcula o valor do procedimento baseado no código, médico e se tem carteirinha especial"""
@@ -121,73 +263,59 @@ class SAVIBusinessLogic:
         pacotes_aplicados = []
         df_producao = df_producao.copy()
         
-        logging.info(f"Iniciando detecção de pacotes em {len(df_producao)} registros")
-        
         # Filtrar apenas procedimentos elegíveis para pacote primeiro
         df_elegivel = df_producao[df_producao['procedimento_codigo'].isin(PROCEDIMENTOS_PACOTE)].copy()
-        logging.info(f"Encontrados {len(df_elegivel)} registros com procedimentos elegíveis para pacote")
+        total_elegiveis = len(df_elegivel)
         
         # CORRIGIDO: Filtrar apenas registros com qtde_realizada > 0
         if 'qtde_realizada' in df_elegivel.columns:
-            antes_filtro = len(df_elegivel)
             df_elegivel = df_elegivel[df_elegivel['qtde_realizada'] > 0].copy()
-            logging.info(f"Filtro qtde_realizada > 0: {len(df_elegivel)} registros válidos (eram {antes_filtro})")
         else:
-            logging.warning("Coluna 'qtde_realizada' não encontrada. Usando todos os registros.")
+            logger.warning("Coluna 'qtde_realizada' não encontrada. Usando todos os registros.")
         
         # Tentar agrupar por mês se houver data válida
         tem_data_valida = False
+        datas_validas = 0
         if 'data_execucao' in df_elegivel.columns:
             # CORRIGIDO: Converter datas brasileiras (dd/mm/yyyy) corretamente
             df_elegivel['data_execucao'] = pd.to_datetime(df_elegivel['data_execucao'], format='%d/%m/%Y', errors='coerce')
             df_elegivel['mes_ano'] = df_elegivel['data_execucao'].dt.to_period('M')
             tem_data_valida = df_elegivel['mes_ano'].notna().any()
-            logging.info(f"Data válida encontrada: {tem_data_valida}")
-            
-            # Debug: verificar quantas datas são válidas
-            datas_validas = df_elegivel['data_execucao'].notna().sum()
-            logging.info(f"Registros com data válida: {datas_validas} de {len(df_elegivel)}")
-            
-            # Debug: mostrar alguns exemplos de conversão
-            if datas_validas > 0:
-                sample_dates = df_elegivel[df_elegivel['data_execucao'].notna()][['data_execucao', 'mes_ano']].head(3)
-                logging.info(f"Exemplo de datas convertidas: {sample_dates.to_dict('records')}")
+            datas_validas = int(df_elegivel['data_execucao'].notna().sum())
         
         if tem_data_valida:
             # Agrupar por paciente e mês
             grupos = df_elegivel.groupby(['usuario_codigo', 'mes_ano'])
-            logging.info("Agrupando por paciente e mês")
         else:
             # Se não há data válida, agrupar apenas por paciente (considerando todo o período)
             df_elegivel['mes_ano'] = 'total'
             grupos = df_elegivel.groupby(['usuario_codigo'])
-            logging.info("Agrupando apenas por paciente (sem data)")
+        
+        # Contadores agregados no lugar de uma linha de log por grupo
+        total_grupos = 0
+        grupos_proximos = 0
+        log_detalhado = logger.isEnabledFor(logging.DEBUG)
         
         for chave, grupo in grupos:
             if tem_data_valida:
                 usuario_codigo, mes_ano = chave
                 if pd.isna(mes_ano):
                     continue
-                    
-                # Debug: mostrar detalhes do agrupamento
                 mes_ano_str = str(mes_ano)
-                logging.info(f"Processando {usuario_codigo} no mês {mes_ano_str}")
             else:
                 usuario_codigo = chave
                 mes_ano = 'Período Total'
                 mes_ano_str = mes_ano
+            total_grupos += 1
                 
             # CORRIGIDO: Contar sessões baseado em qtde_realizada
             if 'qtde_realizada' in grupo.columns:
                 total_sessoes = int(grupo['qtde_realizada'].sum())
-                logging.info(f"Usando qtde_realizada: {usuario_codigo} tem {total_sessoes} sessões realizadas")
             else:
                 total_sessoes = len(grupo)
-                logging.info(f"Usando contagem de registros: {usuario_codigo} tem {total_sessoes} registros")
             
-            # Log para debug - mostrar todos os pacientes com mais de 6 sessões
-            if total_sessoes >= 6:
-                logging.info(f"Debug: {usuario_codigo} tem {total_sessoes} sessões elegíveis em {mes_ano_str}")
+            if 6 <= total_sessoes < 12:
+                grupos_proximos += 1
             
             if total_sessoes >= 12:
                 # Determinar tipo de pacote (comum ou especial)
@@ -204,9 +332,22 @@ class SAVIBusinessLogic:
                     'sessoes_ids': grupo.index.tolist()
                 })
                 
-                logging.info(f"🎯 PACOTE DETECTADO: {usuario_codigo} - {total_sessoes} sessões - {tipo_pacote} - R$ {valor_pacote}")
+                if log_detalhado:
+                    logger.debug("Pacote detectado: %s %s - %d sessões - %s",
+                                 usuario_codigo, mes_ano_str, total_sessoes, tipo_pacote)
         
-        logging.info(f"Total de pacotes detectados: {len(pacotes_aplicados)}")
+        especiais = sum(1 for p in pacotes_aplicados if p['tipo_pacote'] == 'especial')
+        logger.info("Detecção de pacotes concluída", extra={'fields': {
+            'registros': len(df_producao),
+            'elegiveis': total_elegiveis,
+            'realizados': len(df_elegivel),
+            'datas_validas': datas_validas,
+            'agrupamento': 'paciente_mes' if tem_data_valida else 'paciente',
+            'grupos': total_grupos,
+            'grupos_6_a_11_sessoes': grupos_proximos,
+            'pacotes_comuns': len(pacotes_aplicados) - especiais,
+            'pacotes_especiais': especiais,
+        }})
         return pacotes_aplicados
     
     def validar_empresa_procedimento(self, df_processado):
@@ -242,8 +383,8 @@ class SAVIBusinessLogic:
                 
         return inconsistencias
     
-    def aplicar_pacotes(self, df_producao, pacotes):
-        """Aplica valores de pacotes anulando sessões individuais"""
+    def precificar_registros(self, df_producao, pacotes):
+        """Calcula o valor de cada sessão, anulando as que fazem parte de pacotes"""
         df_processado = df_producao.copy()
         
         # Criar coluna de valor calculado
@@ -263,28 +404,37 @@ class SAVIBusinessLogic:
         # Anular valores das sessões que fazem parte de pacotes
         df_processado.loc[df_processado.index.isin(sessoes_em_pacotes), 'valor_unitario'] = 0.0
         
-        # Adicionar registros de pacotes como novas linhas
-        for pacote in pacotes:
-            novo_registro = {
-                'empresa': 'PACOTE',
-                'servico': f"Pacote {pacote['tipo_pacote'].upper()}",
-                'rede': '',
-                'data_execucao': '', 
-                'usuario_codigo': pacote['usuario_codigo'],
-                'usuario_nome': pacote['usuario_nome'],
-                'medico_codigo': '',
-                'medico_nome': 'SISTEMA',
-                'procedimento_codigo': 'PACOTE',
-                'procedimento_nome': f"Pacote {pacote['quantidade_sessoes']} sessões - {pacote['tipo_pacote']}",
-                'urgencia': '',
-                'qtde_autorizada': pacote['quantidade_sessoes'],
-                'qtde_realizada': pacote['quantidade_sessoes'],
-                'data_autorizacao': '',
-                'numero_guia': '',
-                'senha': '',
-                'valor_unitario': pacote['valor_pacote']
-            }
-            df_processado = pd.concat([df_processado, pd.DataFrame([novo_registro])], ignore_index=True)
+        return df_processado
+    
+    def registros_pacotes(self, pacotes):
+        """Monta as linhas de faturamento dos pacotes detectados"""
+        return pd.DataFrame([{
+            'empresa': 'PACOTE',
+            'servico': f"Pacote {pacote['tipo_pacote'].upper()}",
+            'rede': '',
+            'data_execucao': '', 
+            'usuario_codigo': pacote['usuario_codigo'],
+            'usuario_nome': pacote['usuario_nome'],
+            'medico_codigo': '',
+            'medico_nome': 'SISTEMA',
+            'procedimento_codigo': 'PACOTE',
+            'procedimento_nome': f"Pacote {pacote['quantidade_sessoes']} sessões - {pacote['tipo_pacote']}",
+            'urgencia': '',
+            'qtde_autorizada': pacote['quantidade_sessoes'],
+            'qtde_realizada': pacote['quantidade_sessoes'],
+            'data_autorizacao': '',
+            'numero_guia': '',
+            'senha': '',
+            'valor_unitario': pacote['valor_pacote']
+        } for pacote in pacotes])
+    
+    def aplicar_pacotes(self, df_producao, pacotes):
+        """Aplica valores de pacotes anulando sessões individuais"""
+        df_processado = self.precificar_registros(df_producao, pacotes)
+        
+        # Adicionar registros de pacotes como novas linhas (um único concat)
+        if pacotes:
+            df_processado = pd.concat([df_processado, self.registros_pacotes(pacotes)], ignore_index=True)
         
         return df_processado
     
@@ -354,13 +504,82 @@ class SAVIBusinessLogic:
         
         return resumos
     
-    def process_faturamento(self, df_producao, excel_path=None):
-        """Processa faturamento aplicando todas as regras de negócio conforme especificação"""
+    def particionar_por_mes(self, df_producao):
+        """
+        Divide os registros por mês de execução para processamento independente.
+        
+        Retorna lista de (posicoes, detectar_pacotes) ou None quando o agrupamento serial
+        não seria por paciente/mês (sem datas válidas entre os elegíveis a pacote).
+        """
+        if df_producao.empty or 'data_execucao' not in df_producao.columns:
+            return None
+        
+        elegivel = df_producao['procedimento_codigo'].isin(PROCEDIMENTOS_PACOTE)
+        if 'qtde_realizada' in df_producao.columns:
+            elegivel &= df_producao['qtde_realizada'] > 0
+        
+        mes_ano = pd.to_datetime(df_producao['data_execucao'], format='%d/%m/%Y', errors='coerce').dt.to_period('M')
+        if not mes_ano[elegivel.values].notna().any():
+            return None
+        
+        particoes = []
+        for chave, posicoes in mes_ano.groupby(mes_ano, dropna=False, sort=True).indices.items():
+            # Registros sem data válida nunca entram em pacotes no agrupamento por mês
+            particoes.append((posicoes, not pd.isna(chave)))
+        return particoes
+    
+    def _processar_particionado(self, df_producao, particoes, max_workers=None):
+        """Processa partições mensais em paralelo e combina os resultados parciais"""
+        tarefas = [(df_producao.iloc[posicoes], posicoes, self.carteirinhas_especiais, detectar)
+                   for posicoes, detectar in particoes]
+        
+        with ProcessPoolExecutor(max_workers=max_workers or min(len(tarefas), os.cpu_count() or 1)) as executor:
+            parciais = list(executor.map(_processar_particao, tarefas))
+        
+        # Pacotes na mesma ordem do groupby serial (paciente, mês)
+        pacotes = sorted((p for parcial in parciais for p in parcial[0]),
+                         key=lambda p: (p['usuario_codigo'], p['mes_ano']))
+        
+        # Remontar valores na ordem original e anexar linhas de pacotes
+        valores = np.empty(len(df_producao), dtype=float)
+        for (posicoes, _), parcial in zip(particoes, parciais):
+            valores[posicoes] = parcial[1]
+        df_processado = df_producao.copy()
+        df_processado['valor_unitario'] = valores
+        
+        inconsistencias = sorted((inc for parcial in parciais for inc in parcial[2]),
+                                 key=lambda inc: inc['registro_id'])
+        resumos = {}
+        for parcial in parciais:
+            resumos = combinar_resumos(resumos, parcial[3])
+        
+        if pacotes:
+            df_pacotes = self.registros_pacotes(pacotes)
+            df_pacotes.index = pd.RangeIndex(len(df_producao), len(df_producao) + len(df_pacotes))
+            df_processado = pd.concat([df_processado, df_pacotes], ignore_index=True)
+            inconsistencias.extend(self.validar_empresa_procedimento(df_pacotes))
+            resumos = combinar_resumos(resumos, self.gerar_resumos(df_pacotes))
+        else:
+            # Sem concat o serial mantém os rótulos originais do índice
+            rotulos = df_producao.index.tolist()
+            for inc in inconsistencias:
+                inc['registro_id'] = rotulos[inc['registro_id']]
+        
+        return pacotes, df_processado, inconsistencias, _ordenar_resumos(resumos, df_processado)
+    
+    def process_faturamento(self, df_producao, excel_path=None, parallel=False, max_workers=None):
+        """
+        Processa faturamento aplicando todas as regras de negócio conforme especificação.
+        
+        Com parallel=True os meses são processados em um ProcessPoolExecutor; o resultado
+        é idêntico ao do caminho serial.
+        """
         if excel_path:
-            self.load_carteirinhas_especiais(excel_path)
+            with stage('load_excel'):
+                self.load_carteirinhas_especiais(excel_path)
             
         resultado = {
-            'dados_processados': [],
+            'dados_processados': RegistrosProcessados(pd.DataFrame()),
             'resumo_financeiro': {},
             'resumo_por_empresa': {},
             'resumo_por_especialidade': {},
@@ -371,32 +590,128 @@ class SAVIBusinessLogic:
         }
         
         try:
-            logging.info(f"Iniciando processamento de {len(df_producao)} registros")
+            particoes = self.particionar_por_mes(df_producao) if parallel else None
             
-            # Detectar pacotes de 12 sessões por mês/paciente
-            pacotes = self.detectar_pacotes(df_producao.copy())
-            resultado['pacotes_aplicados'] = pacotes
-            logging.info(f"Detectados {len(pacotes)} pacotes")
-            
-            # Aplicar valores de pacotes (anular sessões individuais e aplicar valor do pacote)
-            df_processado = self.aplicar_pacotes(df_producao.copy(), pacotes)
+            if particoes and len(particoes) > 1:
+                with stage('processamento_paralelo'):
+                    pacotes, df_processado, inconsistencias, resumos = self._processar_particionado(
+                        df_producao, particoes, max_workers)
+            else:
+                # Detectar pacotes de 12 sessões por mês/paciente
+                with stage('detectar_pacotes'):
+                    pacotes = self.detectar_pacotes(df_producao.copy())
+                
+                # Aplicar valores de pacotes (anular sessões individuais e aplicar valor do pacote)
+                with stage('aplicar_pacotes'):
+                    df_processado = self.aplicar_pacotes(df_producao.copy(), pacotes)
+                
+                # Validar inconsistências empresa x procedimento
+                with stage('validar_empresa_procedimento'):
+                    inconsistencias = self.validar_empresa_procedimento(df_processado)
+                
+                # Gerar resumos detalhados
+                with stage('gerar_resumos'):
+                    resumos = self.gerar_resumos(df_processado)
             
-            # Validar inconsistências empresa x procedimento
-            inconsistencias = self.validar_empresa_procedimento(df_processado)
+            resultado['pacotes_aplicados'] = pacotes
             resultado['inconsistencias'] = inconsistencias
-            logging.info(f"Detectadas {len(inconsistencias)} inconsistências")
-            
-            # Gerar resumos detalhados
-            resumos = self.gerar_resumos(df_processado)
-            resultado.update(resumos)
+            resultado.update(_arredondar_resumos(resumos))
             
-            logging.info(f"Faturamento total final: R$ {resultado['resumo_financeiro'].get('total_faturado', 0):.2f}")
+            logger.info("Faturamento processado", extra={'fields': {
+                'registros': len(df_producao),
+                'particoes': len(particoes) if particoes else 1,
+                'pacotes': len(pacotes),
+                'inconsistencias': len(inconsistencias),
+                'total_faturado': resultado['resumo_financeiro'].get('total_faturado', 0),
+            }})
             
-            # Converter DataFrame para lista de dicionários para serialização
-            resultado['dados_processados'] = df_processado.to_dict('records')
+            # Registros expostos sob demanda (dicts só são criados ao iterar/paginar)
+            resultado['dados_processados'] = RegistrosProcessados(df_processado)
             
         except Exception as e:
-            logging.error(f"Erro no processamento de faturamento: {e}")
+            logger.error("Erro no processamento de faturamento: %s", e)
             raise e
             
-        return resultado
\ No newline at end of file
+        return resultado
+
+
+def _processar_particao(tarefa):
+    """Processa uma partição mensal em um processo do pool (pacotes, valores, inconsistências, resumos)"""
+    df_particao, posicoes, carteirinhas_especiais, detectar = tarefa
+    logic = SAVIBusinessLogic()
+    logic.carteirinhas_especiais = carteirinhas_especiais
+    
+    pacotes = logic.detectar_pacotes(df_particao) if detectar else []
+    df_precificado = logic.precificar_registros(df_particao, pacotes)
+    
+    # registro_id passa a ser a posição global, reconciliada pelo processo pai
+    inconsistencias = logic.validar_empresa_procedimento(df_precificado.set_axis(posicoes.tolist()))
+    resumos = logic.gerar_resumos(df_precificado)
+    return pacotes, df_precificado['valor_unitario'].to_numpy(dtype=float), inconsistencias, resumos
+
+
+def combinar_resumos(a, b):
+    """Combina dois resumos parciais de gerar_resumos (operação associativa)"""
+    if not a:
+        return b
+    if not b:
+        return a
+    
+    fin_a, fin_b = a['resumo_financeiro'], b['resumo_financeiro']
+    total_faturado = fin_a['total_faturado'] + fin_b['total_faturado']
+    total_registros = fin_a['total_registros'] + fin_b['total_registros']
+    combinado = {
+        'resumo_financeiro': {
+            'total_faturado': total_faturado,
+            'total_registros': total_registros,
+            'total_pacotes': fin_a['total_pacotes'] + fin_b['total_pacotes'],
+            'total_inconsistencias': fin_a['total_inconsistencias'] + fin_b['total_inconsistencias'],
+            'valor_medio': total_faturado / total_registros if total_registros > 0 else 0
+        }
+    }
+    for nome in ('resumo_por_empresa', 'resumo_por_especialidade', 'resumo_por_medico', 'resumo_por_paciente'):
+        resumo = {chave: dict(dados) for chave, dados in a[nome].items()}
+        for chave, dados in b[nome].items():
+            if chave in resumo:
+                for campo, valor in dados.items():
+                    resumo[chave][campo] += valor
+            else:
+                resumo[chave] = dict(dados)
+        combinado[nome] = resumo
+    return combinado
+
+
+def _ordenar_resumos(resumos, df_processado):
+    """Reordena as chaves dos resumos pela primeira ocorrência, como no caminho serial"""
+    def coluna(nome, padrao='N/A'):
+        if nome in df_processado.columns:
+            return df_processado[nome].tolist()
+        return [padrao] * len(df_processado)
+    
+    pacientes = [f"{codigo} - {nome}" for codigo, nome in zip(coluna('usuario_codigo', ''), coluna('usuario_nome'))]
+    ordens = {
+        'resumo_por_empresa': coluna('empresa'),
+        'resumo_por_especialidade': coluna('procedimento_nome'),
+        'resumo_por_medico': coluna('medico_nome'),
+        'resumo_por_paciente': pacientes,
+    }
+    for nome, chaves in ordens.items():
+        resumo = resumos[nome]
+        ordenado = {chave: resumo[chave] for chave in dict.fromkeys(chaves) if chave in resumo}
+        # Chaves não localizadas (ex.: NaN) mantêm a ordem de combinação
+        ordenado.update((chave, dados) for chave, dados in resumo.items() if chave not in ordenado)
+        resumos[nome] = ordenado
+    return resumos
+
+
+def _arredondar_resumos(resumos):
+    """Arredonda valores monetários a centavos, tornando o total independente da ordem de soma"""
+    financeiro = resumos['resumo_financeiro']
+    total_faturado = round(float(financeiro['total_faturado']), 2)
+    financeiro['total_faturado'] = total_faturado
+    total_registros = financeiro['total_registros']
+    financeiro['valor_medio'] = total_faturado / total_registros if total_registros > 0 else 0
+    for nome in ('resumo_por_empresa', 'resumo_por_especialidade', 'resumo_por_medico', 'resumo_por_paciente'):
+        for dados in resumos[nome].values():
+            dados['valor'] = round(float(dados['valor']), 2)
+    return resumos
@@ -0,0 +1,231 @@
+"""
+Upload em partes (retomável) para arquivos acima do MAX_CONTENT_LENGTH
+
+Protocolo:
+    POST /api/uploads                      {filename, size[, sha256]} -> {upload_id, chunk_size, received}
+    GET  /api/uploads/<id>                 partes já recebidas (para retomar)
+    PUT  /api/uploads/<id>?offset=N        corpo = bytes da parte (X-Chunk-Sha256 opcional)
+    POST /api/uploads/<id>/complete        monta, confere tamanho/hash e armazena pelo SHA-256
+
+Cada parte é gravada em arquivo próprio (uploads/.chunks/<id>/<offset>.part), então partes
+podem chegar em paralelo e fora de ordem; reenvios da mesma parte simplesmente a substituem.
+A montagem percorre as partes em ordem calculando o SHA-256 (utils.store_upload_stream).
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from utils import UPLOAD_CHUNK_SIZE, store_upload_stream
+
+CHUNKS_DIRNAME = '.chunks'
+
+
+class UploadError(Exception):
+    """Erro do protocolo de upload em partes (status HTTP em .status)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _chunks_root(upload_folder):
+    return os.path.join(upload_folder, CHUNKS_DIRNAME)
+
+
+def _upload_dir(upload_folder, upload_id):
+    # upload_id vem da URL: aceitar apenas o formato gerado (hex)
+    if not upload_id or len(upload_id) != 32 or any(c not in '0123456789abcdef' for c in upload_id):
+        raise UploadError('Upload não encontrado', 404)
+    return os.path.join(_chunks_root(upload_folder), upload_id)
+
+
+def _write_json(path, dados):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(dados, f)
+    os.replace(temp_path, path)
+
+
+def load_upload(upload_folder, upload_id, user_id):
+    """Metadados do upload, verificando o dono"""
+    path = os.path.join(_upload_dir(upload_folder, upload_id), 'meta.json')
+    try:
+        with open(path) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Upload não encontrado', 404)
+    if meta['user_id'] != user_id:
+        raise UploadError('Acesso negado', 403)
+    return meta
+
+
+def create_upload(upload_folder, user_id, filename, size, chunk_size, max_size, sha256=None):
+    """Registra um novo upload em partes e retorna seus metadados"""
+    if not filename or not isinstance(filename, str):
+        raise UploadError('Nome do arquivo é obrigatório')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('Tamanho do arquivo inválido')
+    if size > max_size:
+        raise UploadError(f'Arquivo muito grande. Máximo: {max_size // (1024 * 1024)}MB', 413)
+
+    upload_id = uuid.uuid4().hex
+    upload_dir = _upload_dir(upload_folder, upload_id)
+    os.makedirs(upload_dir)
+    meta = {
+        'upload_id': upload_id,
+        'user_id': user_id,
+        'filename': filename,
+        'size': size,
+        'chunk_size': chunk_size,
+        'sha256': sha256.lower() if sha256 else None,
+        'created_at': time.time(),
+        'status': 'receiving',
+        'path': None,
+    }
+    _write_json(os.path.join(upload_dir, 'meta.json'), meta)
+    return meta
+
+
+def received_chunks(upload_folder, meta):
+    """Offsets das partes já gravadas por completo"""
+    upload_dir = _upload_dir(upload_folder, meta['upload_id'])
+    offsets = []
+    for nome in os.listdir(upload_dir):
+        if nome.endswith('.part'):
+            offsets.append(int(nome[:-len('.part')]))
+    return sorted(offsets)
+
+
+def _expected_length(meta, offset):
+    if offset < 0 or offset >= meta['size'] or offset % meta['chunk_size']:
+        raise UploadError(f'Offset inválido: {offset}')
+    return min(meta['chunk_size'], meta['size'] - offset)
+
+
+def write_chunk(upload_folder, meta, offset, stream, chunk_sha256=None):
+    """Grava uma parte a partir do stream da requisição (sem carregar o corpo em memória)"""
+    if meta['status'] != 'receiving':
+        raise UploadError('Upload já finalizado', 409)
+    esperado = _expected_length(meta, offset)
+
+    upload_dir = _upload_dir(upload_folder, meta['upload_id'])
+    part_path = os.path.join(upload_dir, f"{offset}.part")
+    temp_path = os.path.join(upload_dir, f"{offset}.{uuid.uuid4().hex}.tmp")
+    sha = hashlib.sha256()
+    gravados = 0
+    try:
+        with open(temp_path, 'wb') as destino:
+            for bloco in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                gravados += len(bloco)
+                if gravados > esperado:
+                    raise UploadError(f'Parte maior que o esperado ({esperado} bytes)')
+                sha.update(bloco)
+                destino.write(bloco)
+        if gravados != esperado:
+            raise UploadError(f'Parte incompleta: {gravados} de {esperado} bytes')
+        if chunk_sha256 and sha.hexdigest() != chunk_sha256.lower():
+            raise UploadError('Hash da parte não confere', 422)
+        os.replace(temp_path, part_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return gravados
+
+
+class _PartsReader:
+    """Leitura sequencial das partes como um único stream"""
+
+    def __init__(self, paths):
+        self._paths = iter(paths)
+        self._atual = None
+
+    def read(self, size):
+        while True:
+            if self._atual is None:
+                path = next(self._paths, None)
+                if path is None:
+                    return b''
+                self._atual = open(path, 'rb')
+            dados = self._atual.read(size)
+            if dados:
+                return dados
+            self._atual.close()
+            self._atual = None
+
+    def close(self):
+        if self._atual is not None:
+            self._atual.close()
+            self._atual = None
+
+
+def complete_upload(upload_folder, meta):
+    """Monta as partes, confere tamanho e hash e armazena o arquivo final"""
+    if meta['status'] == 'complete':
+        return meta
+
+    upload_dir = _upload_dir(upload_folder, meta['upload_id'])
+    # Impede montagens simultâneas do mesmo upload; flock é liberado pelo kernel se o processo morrer
+    with open(os.path.join(upload_dir, 'assemble.lock'), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Upload já está sendo finalizado', 409)
+        try:
+            # Outra requisição (ex.: retry do cliente) pode ter concluído a montagem e removido as partes
+            with open(os.path.join(upload_dir, 'meta.json')) as f:
+                meta = json.load(f)
+            if meta['status'] == 'complete':
+                return meta
+
+            esperados = list(range(0, meta['size'], meta['chunk_size']))
+            faltando = sorted(set(esperados) - set(received_chunks(upload_folder, meta)))
+            if faltando:
+                raise UploadError(f'Partes faltando: {len(faltando)}', 409)
+            return _assemble(upload_folder, upload_dir, meta, esperados)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _assemble(upload_folder, upload_dir, meta, esperados):
+    parts = [os.path.join(upload_dir, f"{offset}.part") for offset in esperados]
+    reader = _PartsReader(parts)
+    try:
+        filepath, digest, reaproveitado = store_upload_stream(reader, meta['filename'], upload_folder)
+    finally:
+        reader.close()
+    if os.path.getsize(filepath) != meta['size'] or (meta['sha256'] and digest != meta['sha256']):
+        if not reaproveitado:
+            os.remove(filepath)
+        raise UploadError('Arquivo montado não confere com o tamanho/hash informado', 422)
+
+    meta.update(status='complete', path=filepath, sha256=digest)
+    _write_json(os.path.join(upload_dir, 'meta.json'), meta)
+    for part in parts:
+        os.remove(part)
+    return meta
+
+
+def finish_upload(upload_folder, meta):
+    """Remove os metadados de um upload já consumido por uma sessão"""
+    shutil.rmtree(_upload_dir(upload_folder, meta['upload_id']), ignore_errors=True)
+
+
+def remove_stale_uploads(upload_folder, max_age_seconds):
+    """Remove uploads em partes abandonados há mais de max_age_seconds"""
+    root = _chunks_root(upload_folder)
+    if not os.path.isdir(root):
+        return 0
+    removidos = 0
+    agora = time.time()
+    for upload_id in os.listdir(root):
+        upload_dir = os.path.join(root, upload_id)
+        mtimes = [os.path.getmtime(os.path.join(upload_dir, nome)) for nome in os.listdir(upload_dir)]
+        if agora - max(mtimes, default=os.path.getmtime(upload_dir)) > max_age_seconds:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            removidos += 1
+    return removidos
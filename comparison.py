@@ -0,0 +1,69 @@
+"""
+Comparação entre duas sessões de análise (ex.: mês atual x mês anterior)
+
+Usa apenas os resumos já calculados de cada sessão (cache do worker ou arquivo de
+resultados da sessão): os registros não são carregados nem reprocessados. Os resumos
+por empresa, especialidade e médico são alinhados pelo nome; itens presentes em só uma
+das sessões aparecem como novos ou removidos.
+"""
+
+from session_cache import resumo_pacotes
+
+# Dimensões comparadas: nome -> chave do resultado de process_faturamento
+DIMENSOES = {
+    'empresa': 'resumo_por_empresa',
+    'especialidade': 'resumo_por_especialidade',
+    'medico': 'resumo_por_medico',
+}
+
+CHAVES_COMPARACAO = ('resumo_financeiro', 'pacotes_aplicados') + tuple(DIMENSOES.values())
+
+INDICADORES_FINANCEIROS = ('total_faturado', 'total_registros', 'total_pacotes', 'total_inconsistencias', 'valor_medio')
+
+
+def variacao(base, atual):
+    """Valores, diferença absoluta e percentual (None quando a base é zero)"""
+    base = base or 0
+    atual = atual or 0
+    delta = atual - base
+    return {
+        'base': base,
+        'atual': atual,
+        'delta': round(delta, 2),
+        'delta_pct': round(delta / base * 100, 2) if base else None,
+    }
+
+
+def _quantidade(item):
+    # resumo_por_empresa conta 'registros'; especialidade e médico contam 'sessoes'
+    return item.get('registros', item.get('sessoes', 0))
+
+
+def comparar_dimensao(base, atual):
+    """Linhas alinhadas por nome, ordenadas pela maior variação absoluta de valor"""
+    linhas = []
+    for nome in base.keys() | atual.keys():
+        item_base = base.get(nome)
+        item_atual = atual.get(nome)
+        linha = variacao(item_base and item_base['valor'], item_atual and item_atual['valor'])
+        linha.update(
+            nome=nome,
+            quantidade=variacao(item_base and _quantidade(item_base), item_atual and _quantidade(item_atual)),
+            situacao='novo' if item_base is None else 'removido' if item_atual is None else None,
+        )
+        linhas.append(linha)
+    linhas.sort(key=lambda linha: (-abs(linha['delta']), str(linha['nome'])))
+    return linhas
+
+
+def compare_results(base, atual):
+    """Diferenças entre os resultados de duas sessões (base -> atual)"""
+    fin_base, fin_atual = base['resumo_financeiro'], atual['resumo_financeiro']
+    pac_base, pac_atual = resumo_pacotes(base['pacotes_aplicados']), resumo_pacotes(atual['pacotes_aplicados'])
+    comparacao = {
+        'financeiro': {nome: variacao(fin_base.get(nome), fin_atual.get(nome)) for nome in INDICADORES_FINANCEIROS},
+        'pacotes': {nome: variacao(pac_base[nome], pac_atual[nome]) for nome in pac_base},
+    }
+    for dimensao, chave in DIMENSOES.items():
+        comparacao[dimensao] = comparar_dimensao(base[chave], atual[chave])
+    return comparacao
@@ -0,0 +1,154 @@
+"""
+Compressão de respostas (gzip e, se disponível, brotli)
+
+Respostas comuns acima de um tamanho mínimo são comprimidas por inteiro; respostas em
+streaming (ex.: exportação CSV) são comprimidas bloco a bloco, sem acumular o corpo.
+Corpos com ETag forte ficam em um cache LRU por (ETag, codificação) para não serem
+recomprimidos a cada requisição.
+"""
+
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+
+
+def available_encodings():
+    """Codificações suportadas em ordem de preferência"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """Escolhe a codificação a partir do Accept-Encoding do cliente (None se nenhuma)"""
+    for encoding in available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class _StreamCompressor:
+    """Comprime blocos incrementalmente, liberando a saída a cada bloco (sync flush)"""
+
+    def __init__(self, encoding, level=6):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=min(level, 11))
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def compress_stream(iterable, encoding, level=6):
+    """Gera a versão comprimida de um iterável de blocos (str ou bytes)"""
+    compressor = _StreamCompressor(encoding, level)
+    for bloco in iterable:
+        if isinstance(bloco, str):
+            bloco = bloco.encode('utf-8')
+        if bloco:
+            saida = compressor.chunk(bloco)
+            if saida:
+                yield saida
+    yield compressor.finish()
+
+
+class CompressedBodyCache:
+    """LRU de corpos comprimidos por (ETag, codificação), limitado em bytes"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            corpo = self._itens.get(chave)
+            if corpo is not None:
+                self._itens.move_to_end(chave)
+            return corpo
+
+    def put(self, chave, corpo):
+        if len(corpo) > self.max_bytes:
+            return
+        with self._lock:
+            if chave in self._itens:
+                return
+            self._itens[chave] = corpo
+            self._total += len(corpo)
+            while self._total > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self._total -= len(removido)
+
+
+def init_compression(app):
+    """Registra o hook que comprime as respostas do app Flask"""
+    from flask import request
+
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    level = app.config['COMPRESS_LEVEL']
+    compress_streams = app.config['COMPRESS_STREAMS']
+    cache = CompressedBodyCache(app.config['COMPRESS_CACHE_MAX_BYTES'])
+    app.extensions['compressed_body_cache'] = cache
+
+    @app.after_request
+    def _compress_response(response):
+        response.vary.add('Accept-Encoding')
+
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            if not compress_streams:
+                return response
+            response.response = compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            etag, weak = response.get_etag()
+            # ETag identifica a representação só dentro do recurso: a chave inclui o caminho
+            chave = (request.path, etag, encoding) if etag and not weak else None
+            corpo = cache.get(chave) if chave else None
+            if corpo is None:
+                dados = response.get_data()
+                if len(dados) < min_size:
+                    return response
+                corpo = compress(dados, encoding, level)
+                if chave:
+                    cache.put(chave, corpo)
+            response.set_data(corpo)
+            if chave:
+                # Representação comprimida tem ETag própria (variante por codificação)
+                response.set_etag(f"{etag}-{encoding}")
+
+        response.headers['Content-Encoding'] = encoding
+        return response
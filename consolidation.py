@@ -0,0 +1,165 @@
+"""
+Análise consolidada de várias sessões (ex.: acumulado do ano, várias operadoras)
+
+As tabelas 'producao' dos bancos enviados são combinadas via ATTACH em um banco
+temporário do SQLite (em disco, fora da memória do worker), uma fonte por vez: cada
+fonte é anexada, copiada e desanexada. Só a união já sem duplicatas é lida para o
+DataFrame que passa pelo pipeline de faturamento.
+
+A deduplicação é só entre fontes: uma linha é descartada quando uma fonte anterior já
+trouxe a mesma (numero_guia, senha, data_execucao). Repetições dentro de um mesmo banco
+são sessões reais e entram todas, como na análise da sessão. Fontes são processadas da
+sessão mais recente para a mais antiga, então vale a versão do upload mais novo. Guia e
+senha vazias viram NULL: linhas sem guia ou senha não têm como ser identificadas e são
+mantidas.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from urllib.parse import quote
+
+import pandas as pd
+
+from business_logic import SAVIBusinessLogic
+from profiling import stage, record_rows
+from sqlite_pool import is_immutable
+from upload_janitor import touch_upload
+from upload_validation import COLUNAS_PRODUCAO
+
+logger = logging.getLogger(__name__)
+
+CHAVE_DEDUPLICACAO = ('numero_guia', 'senha', 'data_execucao')
+
+
+def _uri_fonte(path):
+    uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+    if is_immutable(path):
+        uri += "&immutable=1"
+    return uri
+
+
+def _coluna_origem(coluna):
+    # Guia e senha vazias (ou só espaços) não identificam a linha: NULL nunca é igual a nada
+    if coluna in ('numero_guia', 'senha'):
+        return f"NULLIF(trim(f.{coluna}), '')"
+    return f"f.{coluna}"
+
+
+def load_consolidated_producao(db_paths):
+    """União deduplicada entre fontes das tabelas producao: (DataFrame, estatísticas por fonte)"""
+    colunas = ', '.join(COLUNAS_PRODUCAO)
+    origem = ', '.join(_coluna_origem(coluna) for coluna in COLUNAS_PRODUCAO)
+    mesma_chave = ' AND '.join(f"p.{coluna} = {_coluna_origem(coluna)}" for coluna in CHAVE_DEDUPLICACAO)
+    # Nome vazio: banco temporário privado, gravado em disco quando passa do cache
+    conn = sqlite3.connect('', uri=True, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(f"CREATE TABLE producao ({colunas}, fonte INTEGER NOT NULL)")
+        conn.execute(f"CREATE INDEX ix_producao_chave ON producao ({', '.join(CHAVE_DEDUPLICACAO)})")
+
+        fontes = []
+        for indice, path in enumerate(db_paths):
+            touch_upload(path)
+            conn.execute("ATTACH DATABASE ? AS fonte", (_uri_fonte(path),))
+            try:
+                lidas = conn.execute("SELECT count(*) FROM fonte.producao").fetchone()[0]
+                antes = conn.total_changes
+                conn.execute("BEGIN")
+                # Só descarta o que uma fonte anterior já trouxe; repetições da própria fonte ficam
+                conn.execute(
+                    f"INSERT INTO producao ({colunas}, fonte) SELECT {origem}, ? FROM fonte.producao f "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM producao p WHERE p.fonte < ? AND {mesma_chave})",
+                    (indice, indice))
+                conn.execute("COMMIT")
+                incluidas = conn.total_changes - antes
+                fontes.append({'linhas': lidas, 'incluidas': incluidas, 'duplicadas': lidas - incluidas})
+            finally:
+                conn.execute("DETACH DATABASE fonte")
+
+        df = pd.read_sql_query(
+            f"SELECT {colunas} FROM producao ORDER BY data_execucao, usuario_codigo", conn)
+    finally:
+        conn.close()
+
+    estatisticas = {
+        'fontes': fontes,
+        'linhas_lidas': sum(f['linhas'] for f in fontes),
+        'linhas_unicas': len(df),
+    }
+    estatisticas['duplicadas'] = estatisticas['linhas_lidas'] - estatisticas['linhas_unicas']
+    return df, estatisticas
+
+
+def resumo_por_mes(resultado):
+    """Registros e faturamento por mês (sessões avulsas + pacotes) em ordem cronológica"""
+    df = resultado['dados_processados'].frame
+    meses = {}
+    if not df.empty:
+        sessoes = df[df['procedimento_codigo'] != 'PACOTE']
+        mes_ano = pd.to_datetime(sessoes['data_execucao'], format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m')
+        agrupado = sessoes['valor_unitario'].groupby(mes_ano.fillna('sem data')).agg(['count', 'sum'])
+        for mes, (registros, valor) in agrupado.iterrows():
+            meses[mes] = {'registros': int(registros), 'valor_sessoes': float(valor),
+                          'pacotes': 0, 'valor_pacotes': 0.0}
+    for pacote in resultado['pacotes_aplicados']:
+        mes = meses.setdefault(pacote['mes_ano'], {'registros': 0, 'valor_sessoes': 0.0,
+                                                   'pacotes': 0, 'valor_pacotes': 0.0})
+        mes['pacotes'] += 1
+        mes['valor_pacotes'] += pacote['valor_pacote']
+    for mes in meses.values():
+        mes['valor_sessoes'] = round(mes['valor_sessoes'], 2)
+        mes['valor_pacotes'] = round(mes['valor_pacotes'], 2)
+        mes['valor'] = round(mes['valor_sessoes'] + mes['valor_pacotes'], 2)
+    return dict(sorted(meses.items()))
+
+
+def ordem_das_fontes(sessions):
+    """Sessões na ordem de precedência da deduplicação: do upload mais recente ao mais antigo"""
+    return sorted(sessions, key=lambda s: (s.created_at, s.id), reverse=True)
+
+
+def fontes_por_sessao(sessions, consolidacao):
+    """Estatísticas por fonte com o id da sessão, para as sessões de quem consulta
+
+    O resultado em cache é compartilhado por sessões com os mesmos arquivos (de qualquer
+    usuário), então os ids não ficam nele: são associados a cada requisição.
+    """
+    return [dict(fonte, session_id=sessao.id)
+            for sessao, fonte in zip(ordem_das_fontes(sessions), consolidacao['fontes'])]
+
+
+def process_consolidated(sessions, parallel=False):
+    """Pipeline de faturamento sobre a união, deduplicada entre fontes, das sessões informadas"""
+    inicio = time.perf_counter()
+    sessions = ordem_das_fontes(sessions)
+
+    with stage('load_consolidado'):
+        df_producao, estatisticas = load_consolidated_producao([s.db_file_path for s in sessions])
+    record_rows(len(df_producao))
+    if df_producao.empty:
+        raise ValueError("Nenhum registro nas sessões selecionadas")
+
+    # Carteirinhas especiais: união das planilhas de todas as sessões
+    logic = SAVIBusinessLogic()
+    carteirinhas = set()
+    with stage('load_excel'):
+        for excel_path in {s.excel_file_path for s in sessions if s.excel_file_path}:
+            logic.load_carteirinhas_especiais(excel_path)
+            carteirinhas |= logic.carteirinhas_especiais
+    logic.carteirinhas_especiais = carteirinhas
+
+    resultado = logic.process_faturamento(df_producao, parallel=parallel)
+    resultado['resumo_por_mes'] = resumo_por_mes(resultado)
+    estatisticas['carteirinhas_especiais'] = len(carteirinhas)
+    resultado['consolidacao'] = estatisticas
+
+    logger.info("Consolidação processada", extra={'fields': {
+        'sessoes': [s.id for s in sessions],
+        'linhas_lidas': estatisticas['linhas_lidas'],
+        'duplicadas': estatisticas['duplicadas'],
+        'duracao_ms': round((time.perf_counter() - inicio) * 1000, 2),
+    }})
+    return resultado
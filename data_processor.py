@@ -2,47 +2,97 @@
 Processador de dados SAVI - Nova implementação com regras de negócio completas
 """
 
-import sqlite3
 import pandas as pd
 import logging
 import os
 from datetime import datetime
 from typing import Optional
-from business_logic import SAVIBusinessLogic
+from business_logic import SAVIBusinessLogic, COLUNAS_FILTRO, contar_valores_distintos, perfil_qualidade
+from profiling import stage, record_rows
+from sqlite_pool import readonly_connection
+from upload_janitor import touch_upload
+
+logger = logging.getLogger(__name__)
 # Importações removidas para evitar importação circular
 
+def find_divinopolis_excel(upload_folder='uploads'):
+    """Planilha de Divinópolis enviada mais recentemente (None se não houver)
+    
+    Os uploads são gravados pelo SHA-256 do conteúdo, então o nome original vem da
+    sessão (excel_filename); arquivos antigos, gravados com o nome original, ainda são
+    encontrados pela busca na pasta.
+    """
+    try:
+        from sqlalchemy import or_
+        from models import AnalysisSession
+        nome = AnalysisSession.excel_filename
+        sessoes = AnalysisSession.query.filter(or_(nome.ilike('%divinopolis%'), nome.ilike('%divinópolis%')))\
+            .order_by(AnalysisSession.created_at.desc(), AnalysisSession.id.desc()).limit(20)
+        for sessao in sessoes:
+            if sessao.excel_file_path and os.path.exists(sessao.excel_file_path):
+                return sessao.excel_file_path
+    except RuntimeError:
+        # Fora do contexto do app (ex.: scripts): apenas a busca na pasta
+        pass
+    
+    for root, dirs, files in os.walk(upload_folder):
+        for file in sorted(files):
+            if 'divinopolis' in file.lower() and file.lower().endswith(('.xlsx', '.xls')):
+                return os.path.join(root, file)
+    return None
+
 class SAVIDataProcessor:
     """
     Processador principal dos dados SAVI com todas as regras de negócio
     """
     
-    def __init__(self, db_path: str, excel_path: Optional[str] = None):
+    def __init__(self, db_path: str, excel_path: Optional[str] = None, parallel: Optional[bool] = None):
         self.db_path = db_path
         self.excel_path = excel_path
+        # Último acesso dos arquivos enviados (usado pela limpeza LRU)
+        touch_upload(db_path)
+        touch_upload(excel_path)
         self.business_logic = SAVIBusinessLogic()
+        # Processamento mensal em paralelo (padrão via SAVI_PARALLEL_MONTHS=1)
+        if parallel is None:
+            parallel = os.environ.get('SAVI_PARALLEL_MONTHS', '0') == '1'
+        self.parallel = parallel
         
     def load_data_from_sqlite(self):
         """Carrega dados da tabela producao do SQLite"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            query = """
+            with stage('load_sqlite'):
+                query = """
                 SELECT empresa, servico, rede, data_execucao, usuario_codigo, usuario_nome,
                        medico_codigo, medico_nome, procedimento_codigo, procedimento_nome,
                        urgencia, qtde_autorizada, qtde_realizada, data_autorizacao, 
                        numero_guia, senha
                 FROM producao
                 ORDER BY data_execucao, usuario_codigo
-            """
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+                """
+                with readonly_connection(self.db_path) as conn:
+                    df = pd.read_sql_query(query, conn)
+            record_rows(len(df))
             
-            logging.info(f"Carregados {len(df)} registros da tabela producao")
+            logger.debug("Carregados %d registros da tabela producao", len(df))
             return df
             
         except Exception as e:
-            logging.error(f"Erro ao carregar dados: {e}")
+            logger.error("Erro ao carregar dados: %s", e)
             return pd.DataFrame()
     
+    def distinct_values(self):
+        """Valores distintos e contagens das colunas de filtro via GROUP BY (sem carregar a tabela)"""
+        valores = {}
+        with readonly_connection(self.db_path) as conn:
+            for chave, coluna in COLUNAS_FILTRO.items():
+                rows = conn.execute(
+                    f"SELECT {coluna}, COUNT(*) FROM producao WHERE {coluna} IS NOT NULL "
+                    f"GROUP BY {coluna} ORDER BY {coluna}"
+                ).fetchall()
+                valores[chave] = {str(valor): n for valor, n in rows}
+        return valores
+    
     def process_analysis_session(self, session_id: int):
         """
         Processa uma sessão de análise completa aplicando todas as regras de negócio
@@ -53,18 +103,27 @@ class SAVIDataProcessor:
             if df_producao.empty:
                 raise Exception("Nenhum dado foi carregado")
             
+            # Valores distintos e perfil de qualidade: calculados só aqui, na ingestão, e guardados na sessão
+            with stage('valores_distintos'):
+                valores_distintos = contar_valores_distintos(df_producao)
+            with stage('perfil_qualidade'):
+                perfil = perfil_qualidade(df_producao, valores_distintos)
+            
             # Processar com regras de negócio
             resultado = self.business_logic.process_faturamento(
                 df_producao, 
-                excel_path=self.excel_path
+                excel_path=self.excel_path,
+                parallel=self.parallel
             )
+            resultado['valores_distintos'] = valores_distintos
+            resultado['perfil_qualidade'] = perfil
             
             # Apenas processar e retornar resultado (sem salvar no DB para evitar importação circular)
-            logging.info(f"Sessão {session_id} processada com sucesso")
+            logger.info("Sessão %s processada com sucesso", session_id)
             return resultado
             
         except Exception as e:
-            logging.error(f"Erro no processamento da sessão {session_id}: {e}")
+            logger.error("Erro no processamento da sessão %s: %s", session_id, e)
             raise e
     
     def get_dashboard_data(self):
@@ -77,15 +136,18 @@ class SAVIDataProcessor:
                 return {}
             
             # Processar dados para dashboard
-            resultado = self.business_logic.process_faturamento(df_producao, self.excel_path)
+            resultado = self.business_logic.process_faturamento(df_producao, self.excel_path,
+                                                                parallel=self.parallel)
             
             # Calcular dados de Divinópolis separadamente
             divinopolis_data = self._calculate_divinopolis_data(df_producao)
             
-            # Debug dos valores calculados
-            logging.info(f"Valor total faturado: R$ {resultado['resumo_financeiro'].get('total_faturado', 0):,.2f}")
-            logging.info(f"Valor Divinópolis: R$ {divinopolis_data.get('valor_faturado', 0):,.2f}")
-            logging.info(f"Usuários Divinópolis: {divinopolis_data.get('usuarios_encontrados', 0)}")
+            # Debug dos valores calculados (campos crus, sem formatação de moeda)
+            logger.debug("Dados do dashboard calculados", extra={'fields': {
+                'total_faturado': resultado['resumo_financeiro'].get('total_faturado', 0),
+                'valor_divinopolis': divinopolis_data.get('valor_faturado', 0),
+                'usuarios_divinopolis': divinopolis_data.get('usuarios_encontrados', 0),
+            }})
             
             dashboard_data = {
                 'total_registros': len(df_producao),
@@ -104,7 +166,7 @@ class SAVIDataProcessor:
             return dashboard_data
             
         except Exception as e:
-            logging.error(f"Erro ao gerar dados do dashboard: {e}")
+            logger.error("Erro ao gerar dados do dashboard: %s", e)
             return {}
     
     def filter_by_date(self, dashboard_data, data_inicio=None, data_fim=None):
@@ -150,24 +212,18 @@ class SAVIDataProcessor:
             return filtered_data
             
         except Exception as e:
-            logging.error(f"Erro ao filtrar dados por data: {e}")
+            logger.error("Erro ao filtrar dados por data: %s", e)
             return dashboard_data
     
     def _calculate_divinopolis_data(self, df_producao):
         """Calcula dados específicos de Divinópolis para o dashboard"""
         try:
-            # Tentar buscar arquivo de Divinópolis nos uploads
-            divinopolis_excel_files = []
+            # Planilha de Divinópolis enviada (localizada pelo nome original)
+            divinopolis_excel_path = find_divinopolis_excel()
             
-            # Procurar arquivos Excel relacionados a Divinópolis
-            for root, dirs, files in os.walk('uploads'):
-                for file in files:
-                    if 'divinopolis' in file.lower() and file.lower().endswith(('.xlsx', '.xls')):
-                        divinopolis_excel_files.append(os.path.join(root, file))
-            
-            if not divinopolis_excel_files:
+            if not divinopolis_excel_path:
                 # Se não há arquivo específico de Divinópolis, calcular estimativa baseada nos dados gerais
-                logging.info("Arquivo de Divinópolis não encontrado, calculando estimativa dos dados")
+                logger.debug("Arquivo de Divinópolis não encontrado, calculando estimativa dos dados")
                 
                 # Aplicar business logic aos dados gerais primeiro
                 resultado = self.business_logic.process_faturamento(df_producao, self.excel_path)
@@ -183,9 +239,6 @@ class SAVIDataProcessor:
                     'usuarios_encontrados': int(usuarios_encontrados * 0.2)
                 }
             
-            # Usar o primeiro arquivo encontrado
-            divinopolis_excel_path = divinopolis_excel_files[0]
-            
             from divinopolis_report import DivinopolisReportGenerator
             
             # Gerar relatório de Divinópolis
@@ -218,7 +271,7 @@ class SAVIDataProcessor:
             }
             
         except Exception as e:
-            logging.error(f"Erro ao calcular dados de Divinópolis: {e}")
+            logger.error("Erro ao calcular dados de Divinópolis: %s", e)
             return {
                 'valor_faturado': 0,
                 'total_usuarios': 0,
@@ -254,5 +307,5 @@ class SAVIDataProcessor:
             return analise_detalhada
             
         except Exception as e:
-            logging.error(f"Erro na análise detalhada: {e}")
+            logger.error("Erro na análise detalhada: %s", e)
             return {}
\ No newline at end of file
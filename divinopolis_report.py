@@ -1,5 +1,5 @@
 import pandas as pd
-import sqlite3
+from sqlite_pool import readonly_connection
 import logging
 from collections import defaultdict
 from datetime import datetime
@@ -49,8 +49,6 @@ class DivinopolisReportGenerator:
     def load_database_data(self, divinopolis_users):
         """Carrega dados do banco que correspondem APENAS aos usuários de Divinópolis"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            
             if not divinopolis_users:
                 self.logger.warning("Nenhum usuário de Divinópolis encontrado na planilha")
                 return pd.DataFrame()
@@ -63,8 +61,8 @@ class DivinopolisReportGenerator:
             ORDER BY usuario_codigo, data_execucao
             """
             
-            df_producao = pd.read_sql_query(query, conn, params=list(divinopolis_users))
-            conn.close()
+            with readonly_connection(self.db_path) as conn:
+                df_producao = pd.read_sql_query(query, conn, params=list(divinopolis_users))
             
             self.logger.info(f"Carregados {len(df_producao)} registros de produção EXCLUSIVAMENTE para usuários de Divinópolis")
             self.logger.info(f"Usuários únicos encontrados: {df_producao['usuario_codigo'].nunique()}")
@@ -157,6 +155,7 @@ class DivinopolisReportGenerator:
             'procedimento_codigo': 'count'
         }).reset_index()
         faturamento_por_procedimento.columns = ['procedimento', 'valor_total', 'usuarios_unicos', 'total_sessoes']
+        faturamento_por_procedimento['valor_medio'] = faturamento_por_procedimento['valor_total'] / faturamento_por_procedimento['total_sessoes']
         faturamento_por_procedimento = faturamento_por_procedimento.sort_values('valor_total', ascending=False)
         
         # Faturamento por médico
@@ -166,6 +165,7 @@ class DivinopolisReportGenerator:
             'procedimento_codigo': 'count'
         }).reset_index()
         faturamento_por_medico.columns = ['medico', 'valor_total', 'usuarios_unicos', 'total_sessoes']
+        faturamento_por_medico['valor_medio'] = faturamento_por_medico['valor_total'] / faturamento_por_medico['total_sessoes']
         faturamento_por_medico = faturamento_por_medico.sort_values('valor_total', ascending=False)
         
         # Faturamento por período (se existir coluna de data)
@@ -202,7 +202,7 @@ class DivinopolisReportGenerator:
             'faturamento_por_procedimento': faturamento_por_procedimento.to_dict('records'),
             'faturamento_por_medico': faturamento_por_medico.to_dict('records'),
             'usuarios_nao_encontrados': list(usuarios_nao_encontrados),
-            'detalhes_registros': df_producao.to_dict('records')[:100]  # Limitar a 100 registros para não sobrecarregar
+            'detalhes_registros': df_producao.head(100).to_dict('records')  # Limitar a 100 registros para não sobrecarregar
         }
         
         if faturamento_por_periodo is not None:
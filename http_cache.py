@@ -0,0 +1,142 @@
+"""
+Requisições condicionais (ETag/Last-Modified) para APIs JSON sobre dados imutáveis
+
+O ETag combina a impressão digital (SHA-256) dos arquivos de origem, a versão das
+regras de negócio e os parâmetros normalizados; quando o cliente já tem a versão
+atual a resposta 304 é enviada sem executar o pipeline.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from flask import request, make_response
+from werkzeug.http import is_resource_modified
+
+from business_logic import VERSAO_REGRAS
+from sqlite_pool import is_immutable, readonly_connection
+
+_SHA256_NOME = re.compile(r'[0-9a-f]{64}')
+
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def file_fingerprint(path):
+    """SHA-256 do arquivo, recalculado apenas quando tamanho ou mtime mudam
+
+    Uploads são gravados como <sha256><ext> em diretório imutável: o hash vem do nome, sem
+    reler o arquivo. Nomes antigos (anteriores ao endereçamento por conteúdo) são lidos.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    if is_immutable(path):
+        nome = os.path.splitext(os.path.basename(path))[0]
+        if _SHA256_NOME.fullmatch(nome):
+            return nome
+    stat = os.stat(path)
+    chave = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _fingerprints_lock:
+        if chave in _fingerprints:
+            return _fingerprints[chave]
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+    digest = sha.hexdigest()
+
+    with _fingerprints_lock:
+        _fingerprints[chave] = digest
+    return digest
+
+
+def table_fingerprint(db_path, table):
+    """Impressão digital barata de uma tabela de um banco que muda (ex.: producao do banco da aplicação)
+
+    Contagem, maior rowid e página raiz (muda se a tabela é recriada): cobre cargas em lote
+    e substituições da tabela sem ler o arquivo inteiro; uma leitura normal do SQLite também
+    enxerga o que ainda está no WAL, ao contrário do mtime do arquivo.
+    """
+    if not db_path or not os.path.exists(db_path):
+        return None
+    try:
+        with readonly_connection(db_path) as conn:
+            raiz = conn.execute("SELECT rootpage FROM sqlite_master WHERE type='table' AND name=?",
+                                (table,)).fetchone()
+            if raiz is None:
+                return None
+            contagem, max_rowid = conn.execute(f'SELECT count(*), max(rowid) FROM "{table}"').fetchone()
+    except sqlite3.Error:
+        return None
+    return f"{raiz[0]}:{contagem}:{max_rowid}"
+
+
+class CacheKey:
+    """Arquivos de origem e parâmetros que determinam o conteúdo de uma resposta"""
+
+    def __init__(self, paths, params=None, use_mtime=True):
+        self.paths = [p for p in paths if p]
+        self.params = params or {}
+        # Sem Last-Modified quando parte do conteúdo vem de params (ex.: table_fingerprint)
+        self.use_mtime = use_mtime
+
+    def etag(self):
+        partes = {
+            'arquivos': [file_fingerprint(p) for p in self.paths],
+            'regras': VERSAO_REGRAS,
+            'params': sorted((str(k), str(v)) for k, v in self.params.items()),
+        }
+        return hashlib.sha256(json.dumps(partes, sort_keys=True).encode()).hexdigest()[:32]
+
+    def last_modified(self):
+        if not self.use_mtime:
+            return None
+        mtimes = [os.path.getmtime(p) for p in self.paths if os.path.exists(p)]
+        if not mtimes:
+            return None
+        return datetime.fromtimestamp(int(max(mtimes)), timezone.utc)
+
+
+def conditional(key_func):
+    """Decorator: responde 304 quando If-None-Match/If-Modified-Since conferem com a chave
+
+    key_func recebe os argumentos da view e retorna um CacheKey (ou None para não usar cache).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            if key is None:
+                return view(*args, **kwargs)
+            # ETag forte identifica uma representação de um único recurso: incluir o endpoint
+            key = CacheKey(key.paths, dict(key.params, endpoint=request.endpoint), key.use_mtime)
+
+            etag = key.etag()
+            last_modified = key.last_modified()
+            # O cliente pode ter a variante comprimida (ETag com sufixo da codificação)
+            validado = next((variante for variante in (etag, f'{etag}-gzip', f'{etag}-br')
+                             if not is_resource_modified(request.environ, etag=variante,
+                                                         last_modified=last_modified)), None)
+            if validado:
+                response = make_response('', 304)
+                response.set_etag(validado)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+
+            if last_modified:
+                response.last_modified = last_modified
+            # Cache apenas no navegador do usuário, sempre revalidando
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,101 @@
+"""
+Provedor JSON do Flask com suporte nativo a tipos numpy/pandas
+
+Usa orjson (C) quando instalado e cai para o módulo json da biblioteca padrão;
+nos dois casos escalares e arrays numpy, Timestamps, Periods e NaN/NaT são
+serializados sem conversões manuais nas rotas.
+"""
+
+import datetime
+import decimal
+import json
+
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(o):
+    """Converte tipos não suportados nativamente pelo serializador"""
+    if isinstance(o, np.generic):
+        valor = o.item()
+        if isinstance(valor, float) and valor != valor:
+            return None
+        return valor
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, (pd.Series, pd.Index)):
+        return o.tolist()
+    if o is pd.NaT or o is pd.NA:
+        return None
+    if isinstance(o, pd.Timestamp):
+        return o.isoformat()
+    if isinstance(o, pd.Period):
+        return str(o)
+    if isinstance(o, (datetime.date, datetime.time)):
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class _FallbackEncoder(json.JSONEncoder):
+    """Encoder da biblioteca padrão que também converte NaN em null"""
+
+    def default(self, o):
+        return _sem_nan(_default(o))
+
+    def iterencode(self, o, _one_shot=False):
+        return super().iterencode(_sem_nan(o), _one_shot)
+
+
+def _sem_nan(o):
+    # json escreve NaN/Infinity (JSON inválido); orjson já escreve null
+    if isinstance(o, float) and (o != o or o in (float('inf'), float('-inf'))):
+        return None
+    if isinstance(o, dict):
+        return {k: _sem_nan(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_sem_nan(v) for v in o]
+    return o
+
+
+class SAVIJSONProvider(DefaultJSONProvider):
+    """JSON provider com backend orjson e suporte a numpy/pandas"""
+
+    def _orjson_options(self):
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if self._app.debug:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj):
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options())
+        return self.dumps(obj).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options()).decode('utf-8')
+        kwargs.setdefault('cls', _FallbackEncoder)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
@@ -0,0 +1,114 @@
+"""
+Configuração de logging assíncrono e estruturado
+
+Os registros são enfileirados pelo QueueHandler e formatados/escritos por uma
+thread dedicada (QueueListener), sem bloquear requisições.
+
+Variáveis de ambiente:
+    LOG_LEVEL   nível do logger raiz (padrão INFO)
+    LOG_LEVELS  níveis por logger, ex.: "business_logic=WARNING,werkzeug=ERROR"
+    LOG_FORMAT  "text" (padrão) ou "json"
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+_listener = None
+
+
+class StructuredTextFormatter(logging.Formatter):
+    """Formato texto com os campos estruturados anexados como chave=valor"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        texto = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            texto += ' ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        return texto
+
+
+class JSONFormatter(logging.Formatter):
+    """Um objeto JSON por linha com os campos estruturados no nível raiz
+
+    Campos com nome de chave do envelope (ts, level, logger, message, exc_info) recebem
+    o prefixo "field_" em vez de sobrescrevê-lo.
+    """
+
+    RESERVADOS = frozenset({'ts', 'level', 'logger', 'message', 'exc_info'})
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            payload.update((f"field_{k}" if k in self.RESERVADOS else k, v) for k, v in fields.items())
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que adia a formatação para a thread do listener"""
+
+    def prepare(self, record):
+        # A fila é local ao processo: não é preciso serializar o registro aqui
+        return record
+
+
+def _parse_levels(spec):
+    niveis = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            nome, nivel = item.split('=', 1)
+            niveis[nome.strip()] = nivel.strip().upper()
+    return niveis
+
+
+def configure_logging():
+    """Instala o handler assíncrono no logger raiz (idempotente)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    formatter = JSONFormatter() if os.environ.get('LOG_FORMAT', 'text').lower() == 'json' \
+        else StructuredTextFormatter()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_InProcessQueueHandler(log_queue))
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+    for nome, nivel in _parse_levels(os.environ.get('LOG_LEVELS')).items():
+        logging.getLogger(nome).setLevel(nivel)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _reconfigure_after_fork():
+    # A thread do listener não sobrevive ao fork (pool de processos, workers do gunicorn)
+    global _listener
+    if _listener is not None:
+        _listener = None
+        configure_logging()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reconfigure_after_fork)
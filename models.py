@@ -22,15 +22,29 @@ class AnalysisSession(db.Model):
     excel_filename = db.Column(db.String(255))
     db_file_path = db.Column(db.String(500))  # Path completo do arquivo DB carregado
     excel_file_path = db.Column(db.String(500))  # Path completo do arquivo Excel carregado
+    db_sha256 = db.Column(db.String(64))  # Hash do conteúdo do banco enviado
+    excel_sha256 = db.Column(db.String(64))  # Hash do conteúdo da planilha enviada
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(50), default='processing')  # processing, completed, error
     total_records = db.Column(db.Integer)
     total_faturado = db.Column(db.Float)
     total_pacotes = db.Column(db.Integer)
     inconsistencias = db.Column(db.Integer)
+    valores_distintos = db.Column(db.Text)  # JSON {empresas|especialidades|medicos: {valor: registros}}
+    perfil_qualidade = db.Column(db.Text)  # JSON do perfil de qualidade calculado na ingestão
+    artifacts_path = db.Column(db.String(500))  # Arquivo SQLite próprio com os resultados processados
     
     user = db.relationship('User', backref=db.backref('analysis_sessions', lazy=True))
     
+    # Listagens do dashboard e de /sessions: filtro por usuário/status e paginação por (created_at, id)
+    __table_args__ = (
+        db.Index('ix_analysis_session_user_status_created', 'user_id', 'status', 'created_at', 'id'),
+        db.Index('ix_analysis_session_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_analysis_session_created', 'created_at', 'id'),
+        # Reaproveitamento de sessões com os mesmos arquivos
+        db.Index('ix_analysis_session_hashes', 'db_sha256', 'excel_sha256', 'status'),
+    )
+    
     def __repr__(self):
         return f'<AnalysisSession {self.id}>'
 
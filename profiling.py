@@ -0,0 +1,206 @@
+"""
+Instrumentação leve de requisições: tempos por etapa do pipeline e log de requisições lentas
+"""
+
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Contexto de medição da requisição corrente (None fora de requisições instrumentadas)
+_current = contextvars.ContextVar('savi_profiling_context', default=None)
+
+# Callback notificado no início de cada etapa (ex.: progresso da sessão via SSE)
+_stage_listener = contextvars.ContextVar('savi_stage_listener', default=None)
+
+
+class RequestProfile:
+    """Acumula tempos de etapas e contagem de linhas de uma requisição"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.rows = None
+        self.ignored = False
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def begin():
+    """Inicia a medição no contexto atual e retorna o token para finalizar"""
+    return _current.set(RequestProfile())
+
+
+def end(token):
+    """Finaliza a medição e devolve o perfil coletado"""
+    profile = _current.get()
+    _current.reset(token)
+    return profile
+
+
+@contextmanager
+def stage_listener(callback):
+    """Instala callback(nome_da_etapa) chamado no início de cada stage() deste contexto"""
+    token = _stage_listener.set(callback)
+    try:
+        yield
+    finally:
+        _stage_listener.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Mede o tempo de uma etapa do pipeline; não faz nada fora de uma requisição medida"""
+    listener = _stage_listener.get()
+    if listener is not None:
+        try:
+            listener(name)
+        except Exception as e:
+            logging.error(f"Erro no listener da etapa {name}: {e}")
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        decorrido = (time.perf_counter() - inicio) * 1000
+        profile.stages[name] = profile.stages.get(name, 0.0) + decorrido
+
+
+def ignore_current_request():
+    """Exclui a requisição corrente do log de lentas (streams e long-polling)"""
+    profile = _current.get()
+    if profile is not None:
+        profile.ignored = True
+
+
+def record_rows(count):
+    """Registra o número de linhas do DataFrame processado na requisição"""
+    profile = _current.get()
+    if profile is not None:
+        profile.rows = max(profile.rows or 0, int(count))
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo em MB (None se indisponível)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    if sys.platform == 'darwin':
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+class SlowRequestLog:
+    """Buffer circular em disco (JSON por linha) limitado a max_entries registros"""
+
+    def __init__(self, path, max_entries=500):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def append(self, entry):
+        linha = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a+', encoding='utf-8') as f:
+                # Trava entre workers do gunicorn enquanto reescreve o buffer
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    linhas = f.read().splitlines()
+                    linhas.append(linha)
+                    if len(linhas) > self.max_entries:
+                        linhas = linhas[-self.max_entries:]
+                        f.seek(0)
+                        f.truncate()
+                        f.write('\n'.join(linhas) + '\n')
+                    else:
+                        f.seek(0, os.SEEK_END)
+                        f.write(linha + '\n')
+                    f.flush()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def entries(self):
+        """Retorna os registros do buffer, do mais antigo para o mais recente"""
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding='utf-8') as f:
+            return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def init_slow_request_log(app):
+    """Registra hooks no app Flask que gravam requisições acima do limite configurado"""
+    from flask import g, request
+    from flask_login import current_user
+
+    threshold_ms = app.config['SLOW_REQUEST_THRESHOLD_MS']
+    slow_log = SlowRequestLog(app.config['SLOW_REQUEST_LOG_PATH'],
+                              app.config['SLOW_REQUEST_LOG_MAX_ENTRIES'])
+    app.extensions['slow_request_log'] = slow_log
+
+    @app.before_request
+    def _start_profile():
+        g._profile_token = begin()
+
+    @app.after_request
+    def _capture_status(response):
+        g._profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_profile(exc):
+        token = g.pop('_profile_token', None)
+        if token is None:
+            return
+        profile = end(token)
+        elapsed = profile.elapsed_ms()
+        if elapsed < threshold_ms or profile.ignored:
+            return
+
+        try:
+            user = current_user.username if current_user.is_authenticated else None
+        except Exception:
+            user = None
+        session_id = (request.view_args or {}).get('session_id') or request.args.get('session_id')
+
+        entry = {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else request.path,
+            'path': request.full_path.rstrip('?'),
+            'status': g.pop('_profile_status', 500 if exc else None),
+            'elapsed_ms': round(elapsed, 1),
+            'user': user,
+            'session_id': session_id,
+            'rows': profile.rows,
+            'stages_ms': {nome: round(ms, 1) for nome, ms in profile.stages.items()},
+            'peak_rss_mb': peak_rss_mb(),
+            'error': repr(exc) if exc else None,
+        }
+        try:
+            slow_log.append(entry)
+        except Exception as e:
+            logging.error(f"Erro ao gravar log de requisição lenta: {e}")
@@ -0,0 +1,112 @@
+"""
+Exportação do relatório geral em CSV (gerador) e Excel (workbook write-only)
+
+As linhas processadas são percorridas uma a uma, sem montar a planilha inteira em
+memória, para que exportações com milhões de registros mantenham uso de memória estável.
+"""
+
+import csv
+import io
+
+import openpyxl
+
+# Colunas dos registros processados na ordem de exportação
+EXPORT_COLUMNS = [
+    ('empresa', 'Empresa'),
+    ('data_execucao', 'Data Execução'),
+    ('usuario_codigo', 'Código Usuário'),
+    ('usuario_nome', 'Usuário'),
+    ('medico_nome', 'Médico'),
+    ('procedimento_codigo', 'Código Procedimento'),
+    ('procedimento_nome', 'Procedimento'),
+    ('qtde_realizada', 'Qtde Realizada'),
+    ('numero_guia', 'Guia'),
+    ('senha', 'Senha'),
+    ('valor_unitario', 'Valor'),
+]
+
+
+def _cell(value):
+    """Normaliza valores pandas/numpy para tipos aceitos por csv/openpyxl"""
+    if value is None:
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    return value
+
+
+def _row_values(registro):
+    return [_cell(registro.get(coluna)) for coluna, _ in EXPORT_COLUMNS]
+
+
+def iter_csv(registros, chunk_size=5000):
+    """Gera o CSV dos registros processados em blocos de texto"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    # BOM para o Excel reconhecer UTF-8 (acentos)
+    buffer.write('\ufeff')
+    writer.writerow([titulo for _, titulo in EXPORT_COLUMNS])
+
+    for i, registro in enumerate(registros, 1):
+        writer.writerow(_row_values(registro))
+        if i % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    restante = buffer.getvalue()
+    if restante:
+        yield restante
+
+
+def _summary_sheet(workbook, titulo, cabecalho, linhas):
+    sheet = workbook.create_sheet(titulo)
+    sheet.append(cabecalho)
+    for linha in linhas:
+        sheet.append([_cell(v) for v in linha])
+
+
+def write_xlsx(resultado, registros, destino):
+    """Grava o relatório geral (registros + abas de resumo) em um workbook write-only"""
+    workbook = openpyxl.Workbook(write_only=True)
+
+    sheet = workbook.create_sheet('Registros')
+    sheet.append([titulo for _, titulo in EXPORT_COLUMNS])
+    for registro in registros:
+        sheet.append(_row_values(registro))
+
+    financeiro = resultado.get('resumo_financeiro', {})
+    _summary_sheet(workbook, 'Resumo Financeiro', ['Indicador', 'Valor'], [
+        ('Total Faturado', financeiro.get('total_faturado', 0)),
+        ('Total de Registros', financeiro.get('total_registros', 0)),
+        ('Total de Pacotes', financeiro.get('total_pacotes', 0)),
+        ('Valor Médio', financeiro.get('valor_medio', 0)),
+        ('Inconsistências', len(resultado.get('inconsistencias', []))),
+    ])
+    _summary_sheet(workbook, 'Por Empresa', ['Empresa', 'Registros', 'Valor'], [
+        (chave, dados.get('registros', 0), dados.get('valor', 0))
+        for chave, dados in resultado.get('resumo_por_empresa', {}).items()
+    ])
+    _summary_sheet(workbook, 'Por Especialidade', ['Procedimento', 'Sessões', 'Valor'], [
+        (chave, dados.get('sessoes', 0), dados.get('valor', 0))
+        for chave, dados in resultado.get('resumo_por_especialidade', {}).items()
+    ])
+    _summary_sheet(workbook, 'Por Médico', ['Médico', 'Sessões', 'Valor'], [
+        (chave, dados.get('sessoes', 0), dados.get('valor', 0))
+        for chave, dados in resultado.get('resumo_por_medico', {}).items()
+    ])
+    _summary_sheet(workbook, 'Pacotes', ['Código Usuário', 'Usuário', 'Mês', 'Sessões', 'Tipo', 'Valor'], [
+        (p.get('usuario_codigo'), p.get('usuario_nome'), p.get('mes_ano'),
+         p.get('quantidade_sessoes'), p.get('tipo_pacote'), p.get('valor_pacote'))
+        for p in resultado.get('pacotes_aplicados', [])
+    ])
+    _summary_sheet(workbook, 'Inconsistências', ['Empresa', 'Procedimento', 'Código Usuário', 'Usuário', 'Data', 'Motivo'], [
+        (i.get('empresa'), i.get('procedimento_nome'), i.get('usuario_codigo'),
+         i.get('usuario_nome'), i.get('data_execucao'), i.get('motivo'))
+        for i in resultado.get('inconsistencias', [])
+    ])
+
+    workbook.save(destino)
@@ -1,15 +1,30 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, send_file
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app, send_file, Response, stream_with_context
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 import os
+import json
 import logging
+import tempfile
+import time
 import pandas as pd
 from datetime import datetime
-from models import AnalysisSession, ProcessedData, User
+from models import AnalysisSession, User
 from app import db
-from data_processor import SAVIDataProcessor
-from report_generator import ReportGenerator
-from utils import save_uploaded_file, cleanup_old_files, format_currency
+from data_processor import SAVIDataProcessor, find_divinopolis_excel
+from report_export import iter_csv, write_xlsx
+from session_cache import (get_session_artifacts, get_session_results, get_consolidated_artifacts, get_divinopolis_artifacts,
+                           store_session_artifacts, invalidate_session, DEFAULT_DB_PATH)
+from session_store import store_path, write_session_store, link_session_store, remove_session_store
+from http_cache import CacheKey, conditional, table_fingerprint
+from profiling import stage_listener, ignore_current_request
+from session_events import broker, format_sse, STATUS_FINAIS
+from utils import save_uploaded_file, validate_uploaded_file, cleanup_old_files, format_currency
+from upload_validation import inspect_file
+from comparison import CHAVES_COMPARACAO, compare_results
+from consolidation import fontes_por_sessao
+from chunked_upload import (UploadError, create_upload, load_upload, received_chunks, write_chunk,
+                            complete_upload, finish_upload)
+from sqlite_pool import discard
 
 main_bp = Blueprint('main', __name__)
 
@@ -23,20 +38,15 @@ def index():
 @login_required
 def dashboard():
     try:
-        # Buscar todas as sessões completadas do usuário para seleção
+        # Sessões completadas mais recentes para seleção (limitado; índice user_id+status+created_at)
         completed_sessions_list = AnalysisSession.query.filter_by(
             user_id=current_user.id, 
             status='completed'
-        ).order_by(AnalysisSession.created_at.desc()).all()
+        ).order_by(AnalysisSession.created_at.desc(), AnalysisSession.id.desc())\
+         .limit(current_app.config['DASHBOARD_SESSION_OPTIONS']).all()
         
-        # Buscar últimas análises do usuário
-        recent_sessions = AnalysisSession.query.filter_by(user_id=current_user.id)\
-                                             .order_by(AnalysisSession.created_at.desc())\
-                                             .limit(5).all()
-        
-        # Estatísticas gerais
-        total_sessions = AnalysisSession.query.filter_by(user_id=current_user.id).count()
-        completed_sessions = AnalysisSession.query.filter_by(user_id=current_user.id, status='completed').count()
+        # Últimas análises e estatísticas gerais em uma única consulta
+        recent_sessions, total_sessions, completed_sessions = _session_overview(current_user.id)
         
         # Filtros de data do request
         data_inicio = request.args.get('data_inicio')
@@ -53,6 +63,9 @@ def dashboard():
         else:
             selected_session = completed_sessions_list[0] if completed_sessions_list else None
         
+        if selected_session and selected_session not in completed_sessions_list:
+            completed_sessions_list.append(selected_session)
+        
         # Carregar dados da sessão selecionada
         dashboard_data = {}
         if selected_session and selected_session.db_file_path:
@@ -90,6 +103,20 @@ def dashboard():
                              dashboard_data={},
                              format_currency=format_currency)
 
+def _session_overview(user_id, limite=5):
+    """Últimas sessões do usuário com total e concluídas em uma consulta (contagens pelos índices)"""
+    do_usuario = AnalysisSession.user_id == user_id
+    total = db.select(db.func.count()).select_from(AnalysisSession).where(do_usuario).scalar_subquery()
+    concluidas = db.select(db.func.count()).select_from(AnalysisSession)\
+                   .where(do_usuario, AnalysisSession.status == 'completed').scalar_subquery()
+    linhas = db.session.query(AnalysisSession, total, concluidas)\
+                       .filter(do_usuario)\
+                       .order_by(AnalysisSession.created_at.desc(), AnalysisSession.id.desc())\
+                       .limit(limite).all()
+    if not linhas:
+        return [], 0, 0
+    return [linha[0] for linha in linhas], linhas[0][1], linhas[0][2]
+
 @main_bp.route('/live_analysis')
 @login_required 
 def live_analysis():
@@ -113,48 +140,54 @@ def live_analysis():
 def upload():
     if request.method == 'POST':
         try:
-            # Verificar se os arquivos foram enviados
-            if 'database_file' not in request.files:
-                flash('Arquivo de banco de dados é obrigatório.', 'error')
-                return render_template('upload.html')
-            
-            db_file = request.files['database_file']
-            excel_file = request.files.get('excel_file')
+            # Arquivos enviados no formulário ou previamente em partes (upload retomável)
+            db_filename, db_path, db_message, db_sha256 = _receive_upload('database', 'db')
+            excel_filename, excel_path, excel_message, excel_sha256 = _receive_upload('excel', 'excel')
             
             # Log para debug
-            logging.info(f"Recebido arquivo de banco: {db_file.filename if db_file else 'None'}")
-            logging.info(f"Recebido arquivo Excel: {excel_file.filename if excel_file and excel_file.filename else 'None'}")
+            logging.info(f"Recebido arquivo de banco: {db_filename or 'None'}")
+            logging.info(f"Recebido arquivo Excel: {excel_filename or 'None'}")
             
             # Verificar se arquivo de banco foi selecionado
-            if not db_file or db_file.filename == '':
+            if not db_filename:
                 flash('Por favor, selecione um arquivo de banco de dados.', 'error')
                 return render_template('upload.html')
             
-            # Salvar arquivo de banco de dados
-            db_path, db_message = save_uploaded_file(db_file, 'db')
             if not db_path:
                 flash(f'Erro no arquivo de banco: {db_message}', 'error')
                 logging.error(f"Erro ao salvar arquivo de banco: {db_message}")
                 return render_template('upload.html')
             
-            # Salvar arquivo Excel (opcional)
-            excel_path = None
-            if excel_file and excel_file.filename:
-                excel_path, excel_message = save_uploaded_file(excel_file, 'excel')
-                if not excel_path:
-                    # Remover arquivo db se excel falhou
-                    os.remove(db_path)
-                    flash(f'Erro no arquivo Excel: {excel_message}', 'error')
-                    return render_template('upload.html')
+            # Arquivo Excel (opcional)
+            if excel_filename and not excel_path:
+                # Remover arquivo db se excel falhou (e nenhuma sessão o usa)
+                _remove_unreferenced_upload(db_path)
+                flash(f'Erro no arquivo Excel: {excel_message}', 'error')
+                return render_template('upload.html')
             
             # Criar nova sessão de análise
             session = AnalysisSession()
             session.user_id = current_user.id
-            session.database_filename = db_file.filename
-            session.excel_filename = excel_file.filename if excel_file and excel_file.filename else None
+            session.database_filename = db_filename
+            session.excel_filename = excel_filename
             session.db_file_path = db_path  # Salvar path do arquivo para usar no dashboard
             session.excel_file_path = excel_path  # Salvar path do Excel para carteirinhas
+            session.db_sha256 = db_sha256
+            session.excel_sha256 = excel_sha256
             session.status = 'processing'
+            
+            # Mesmos arquivos de uma análise já concluída: reaproveitar os resultados
+            existente = _find_processed_session(db_sha256, excel_sha256)
+            if existente:
+                db.session.add(session)
+                db.session.flush()
+                _copy_session_results(existente, session)
+                db.session.commit()
+                broker.publish(session.id, status='completed', stage=None, progress=100)
+                logging.info(f"Sessão {session.id} reaproveitou os resultados da sessão {existente.id}")
+                flash(f'Arquivos idênticos aos da análise #{existente.id}: resultados reaproveitados sem reprocessamento.', 'success')
+                return redirect(url_for('main.analysis', session_id=session.id))
+            
             db.session.add(session)
             db.session.commit()
             
@@ -163,7 +196,9 @@ def upload():
             # Processar dados diretamente (sem thread assíncrona para evitar problemas de contexto)
             try:
                 processor = SAVIDataProcessor(db_path, excel_path)
-                resultado = processor.process_analysis_session(session.id)
+                broker.publish(session.id, status='processing', stage=None, progress=0)
+                with stage_listener(lambda etapa: broker.publish_stage(session.id, etapa)):
+                    resultado = processor.process_analysis_session(session.id)
                 
                 # Atualizar status da sessão com resultados
                 session.status = 'completed'
@@ -171,13 +206,20 @@ def upload():
                 session.total_faturado = resultado['resumo_financeiro']['total_faturado']
                 session.total_pacotes = resultado['resumo_financeiro']['total_pacotes']
                 session.inconsistencias = resultado['resumo_financeiro']['total_inconsistencias']
+                session.valores_distintos = json.dumps(resultado['valores_distintos'], ensure_ascii=False)
+                session.perfil_qualidade = json.dumps(resultado['perfil_qualidade'], ensure_ascii=False)
+                session.artifacts_path = write_session_store(
+                    store_path(current_app.config['SESSION_STORE_FOLDER'], session.id), resultado)
                 db.session.commit()
+                store_session_artifacts(session, resultado)
+                broker.publish(session.id, status='completed', stage=None, progress=100)
                 
                 flash('Análise processada com sucesso!', 'success')
             except Exception as e:
                 logging.error(f"Erro no processamento: {e}")
                 session.status = 'error'
                 db.session.commit()
+                broker.publish(session.id, status='error', stage=None, error=str(e))
                 flash(f'Erro no processamento: {str(e)}', 'error')
             
             # NÃO limpar arquivos - mantê-los para uso no dashboard e relatórios
@@ -193,8 +235,128 @@ def upload():
     
     return render_template('upload.html')
 
+def _receive_upload(prefixo, file_type):
+    """Arquivo do formulário: enviado diretamente (<prefixo>_file) ou em partes (<prefixo>_upload_id)
+    
+    Retorna (nome original, caminho salvo, mensagem, sha256); nome None quando não enviado.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    upload_id = request.form.get(f'{prefixo}_upload_id')
+    if upload_id:
+        try:
+            meta = load_upload(upload_folder, upload_id, current_user.id)
+        except UploadError as e:
+            return upload_id, None, str(e), None
+        if meta['status'] != 'complete' or not os.path.exists(meta['path']):
+            return meta['filename'], None, 'Upload em partes não foi finalizado', None
+        finish_upload(upload_folder, meta)
+        return meta['filename'], meta['path'], validate_uploaded_file(meta['path'], file_type), meta['sha256']
+    
+    file = request.files.get(f'{prefixo}_file')
+    if not file or file.filename == '':
+        return None, None, None, None
+    path, message, sha256 = save_uploaded_file(file, file_type)
+    return file.filename, path, message, sha256
+
+def _find_processed_session(db_sha256, excel_sha256):
+    """Sessão concluída mais recente com o mesmo par de hashes (banco, planilha)"""
+    if not db_sha256:
+        return None
+    return AnalysisSession.query.filter_by(
+        db_sha256=db_sha256,
+        excel_sha256=excel_sha256,
+        status='completed'
+    ).order_by(AnalysisSession.created_at.desc()).first()
+
+def _copy_session_results(origem, destino):
+    """Copia status, totais e arquivo de resultados de uma sessão para outra (destino já com id)"""
+    destino.status = 'completed'
+    destino.total_records = origem.total_records
+    destino.total_faturado = origem.total_faturado
+    destino.total_pacotes = origem.total_pacotes
+    destino.inconsistencias = origem.inconsistencias
+    destino.valores_distintos = origem.valores_distintos
+    destino.perfil_qualidade = origem.perfil_qualidade
+    if origem.artifacts_path and os.path.exists(origem.artifacts_path):
+        destino.artifacts_path = link_session_store(
+            origem.artifacts_path, store_path(current_app.config['SESSION_STORE_FOLDER'], destino.id))
+
+def _remove_unreferenced_upload(path):
+    """Remove um arquivo enviado que não é usado por nenhuma sessão"""
+    referenciado = AnalysisSession.query.filter(db.or_(
+        AnalysisSession.db_file_path == path,
+        AnalysisSession.excel_file_path == path
+    )).first()
+    if not referenciado and os.path.exists(path):
+        discard(path)
+        os.remove(path)
+
 # Removido processamento assíncrono para evitar problemas de contexto Flask
 
+@main_bp.route('/api/uploads', methods=['POST'])
+@login_required
+def create_chunked_upload():
+    """Inicia um upload em partes: {filename, size[, sha256]}"""
+    dados = request.get_json(silent=True) or {}
+    try:
+        meta = create_upload(
+            current_app.config['UPLOAD_FOLDER'], current_user.id,
+            dados.get('filename'), dados.get('size'),
+            current_app.config['CHUNKED_UPLOAD_CHUNK_SIZE'],
+            current_app.config['CHUNKED_UPLOAD_MAX_SIZE'],
+            dados.get('sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(_chunked_upload_payload(meta)), 201
+
+@main_bp.route('/api/uploads/<upload_id>', methods=['GET', 'PUT'])
+@login_required
+def chunked_upload_part(upload_id):
+    """GET: estado do upload (partes recebidas); PUT ?offset=N: grava uma parte"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    try:
+        meta = load_upload(upload_folder, upload_id, current_user.id)
+        if request.method == 'PUT':
+            offset = request.args.get('offset', type=int)
+            if offset is None:
+                raise UploadError('Parâmetro offset é obrigatório')
+            write_chunk(upload_folder, meta, offset, request.stream, request.headers.get('X-Chunk-Sha256'))
+            return jsonify({'upload_id': upload_id, 'offset': offset})
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(_chunked_upload_payload(meta))
+
+@main_bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_chunked_upload(upload_id):
+    """Monta as partes, confere tamanho e hash e valida o arquivo ({tipo: db|excel} opcional)"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    tipo = (request.get_json(silent=True) or {}).get('tipo')
+    try:
+        meta = complete_upload(upload_folder, load_upload(upload_folder, upload_id, current_user.id))
+        payload = _chunked_upload_payload(meta)
+        if tipo in ('db', 'excel'):
+            payload['validacao'] = inspect_file(meta['path'], tipo, quick_check=current_app.config['UPLOAD_QUICK_CHECK'])
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        logging.error(f"Erro ao finalizar upload {upload_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify(payload)
+
+def _chunked_upload_payload(meta):
+    payload = {
+        'upload_id': meta['upload_id'],
+        'filename': meta['filename'],
+        'size': meta['size'],
+        'chunk_size': meta['chunk_size'],
+        'status': meta['status'],
+        'sha256': meta['sha256'],
+    }
+    if meta['status'] == 'receiving':
+        payload['received'] = received_chunks(current_app.config['UPLOAD_FOLDER'], meta)
+    return payload
+
 @main_bp.route('/analysis/<int:session_id>')
 @login_required
 def analysis(session_id):
@@ -205,7 +367,10 @@ def analysis(session_id):
         flash('Acesso negado.', 'error')
         return redirect(url_for('main.dashboard'))
     
-    return render_template('analysis.html', session=session, format_currency=format_currency)
+    # Perfil de qualidade calculado na ingestão (sessões antigas não têm)
+    perfil = json.loads(session.perfil_qualidade) if session.perfil_qualidade else None
+    
+    return render_template('analysis.html', session=session, perfil=perfil, format_currency=format_currency)
 
 @main_bp.route('/reports/<int:session_id>')
 @login_required
@@ -223,19 +388,7 @@ def reports(session_id):
     
     # Gerar relatórios com dados reais do arquivo carregado pelo usuário
     try:
-        # Usar dados do arquivo carregado pelo usuário se disponível
-        if session.db_file_path:
-            processor = SAVIDataProcessor(session.db_file_path, session.excel_file_path)
-            logging.info(f"Usando dados da sessão {session.id} do arquivo carregado: {session.database_filename}")
-        else:
-            # Fallback para dados padrão
-            processor = SAVIDataProcessor('instance/savi_assistant.db')
-            logging.info("Usando dados padrão - arquivo do usuário não encontrado")
-            
-        df_producao = processor.load_data_from_sqlite()
-        
-        # Processar dados com business logic
-        resultado = processor.business_logic.process_faturamento(df_producao)
+        resultado = get_session_artifacts(session).resultado
         
         # Estruturar dados para o template
         reports_data = {
@@ -246,7 +399,7 @@ def reports(session_id):
             },
             'packages': {
                 'success': True,
-                'data': resultado.get('pacotes_aplicados', []),
+                'total': len(resultado.get('pacotes_aplicados', [])),
                 'title': 'Pacotes Aplicados'
             },
             'company': {
@@ -261,7 +414,7 @@ def reports(session_id):
             },
             'inconsistencies': {
                 'success': True,
-                'data': resultado.get('inconsistencias', []),
+                'total': len(resultado.get('inconsistencias', [])),
                 'title': 'Inconsistências Detectadas'
             }
         }
@@ -276,26 +429,207 @@ def reports(session_id):
         flash(f'Erro ao gerar relatórios: {str(e)}', 'error')
         return redirect(url_for('main.analysis', session_id=session_id))
 
+def _session_status_payload(session):
+    """Status da sessão (banco) com a etapa/progresso publicados pelo processamento"""
+    payload = {
+        'status': session.status,
+        'total_records': session.total_records,
+        'total_faturado': session.total_faturado,
+        'total_pacotes': session.total_pacotes,
+        'inconsistencias': session.inconsistencias,
+        'stage': None,
+        'progress': None,
+        'version': 0
+    }
+    estado = broker.get(session.id)
+    if estado:
+        payload.update({k: estado.get(k) for k in ('stage', 'progress', 'version')})
+    return payload
+
+def _reload_session(session_id):
+    """Relê a sessão do banco encerrando a transação corrente (vê commits de outros workers)"""
+    db.session.rollback()
+    return db.session.get(AnalysisSession, session_id, populate_existing=True)
+
+def _wait_session_change(session_id, version, status, timeout):
+    """Aguarda novo evento da sessão ou mudança de status no banco; retorna a sessão relida"""
+    limite = time.monotonic() + timeout
+    intervalo_banco = current_app.config['SESSION_EVENTS_DB_CHECK_SECONDS']
+    while True:
+        restante = limite - time.monotonic()
+        if restante <= 0 or broker.wait(session_id, version, timeout=min(restante, intervalo_banco)):
+            return _reload_session(session_id)
+        session = _reload_session(session_id)
+        if session is None or session.status != status:
+            return session
+
 @main_bp.route('/api/session-status/<int:session_id>')
 @login_required
 def session_status(session_id):
-    """API endpoint para verificar status da sessão"""
+    """API endpoint para verificar status da sessão (long-polling com ?wait=segundos&version=n)"""
     session = AnalysisSession.query.get_or_404(session_id)
     
     # Verificar acesso
     if session.user_id != current_user.id and current_user.role != 'admin':
         return jsonify({'error': 'Acesso negado'}), 403
     
-    return jsonify({
-        'status': session.status,
-        'total_records': session.total_records,
-        'total_faturado': session.total_faturado,
-        'total_pacotes': session.total_pacotes,
-        'inconsistencias': session.inconsistencias
-    })
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    if wait > 0 and session.status not in STATUS_FINAIS:
+        ignore_current_request()
+        version = request.args.get('version', 0, type=int)
+        session = _wait_session_change(session_id, version, session.status, wait) or session
+    
+    return jsonify(_session_status_payload(session))
+
+@main_bp.route('/api/session-events/<int:session_id>')
+@login_required
+def session_events(session_id):
+    """Stream SSE com status e etapas do processamento até a sessão terminar"""
+    session = AnalysisSession.query.get_or_404(session_id)
+    
+    # Verificar acesso
+    if session.user_id != current_user.id and current_user.role != 'admin':
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    ignore_current_request()
+    keepalive = current_app.config['SESSION_EVENTS_KEEPALIVE_SECONDS']
+    duracao_maxima = current_app.config['SESSION_EVENTS_MAX_SECONDS']
+    
+    def generate():
+        # O navegador reconecta sozinho após o tempo máximo do stream
+        yield 'retry: 3000\n\n'
+        limite = time.monotonic() + duracao_maxima
+        atual = session
+        enviado = None
+        while atual is not None:
+            payload = _session_status_payload(atual)
+            chave = (payload['status'], payload['version'])
+            if chave != enviado:
+                enviado = chave
+                yield format_sse(payload, 'status')
+            else:
+                yield ': keepalive\n\n'
+            if payload['status'] in STATUS_FINAIS:
+                yield format_sse(payload, 'done')
+                return
+            if time.monotonic() >= limite:
+                return
+            atual = _wait_session_change(session_id, payload['version'], payload['status'], keepalive)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _page_args():
+    """Página, tamanho, ordenação e filtros de igualdade da query string das APIs paginadas"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 50, type=int)
+    sort = request.args.get('sort') or None
+    descending = request.args.get('order', 'asc').lower() == 'desc'
+    filtros = {k: v for k, v in request.args.items()
+               if k not in ('page', 'per_page', 'sort', 'order') and v != ''}
+    return page, per_page, sort, descending, filtros
+
+@main_bp.route('/api/sessions/<int:session_id>/<any(registros, inconsistencias, pacotes):tabela>')
+@login_required
+def session_table_page(session_id, tabela):
+    """API paginada (com ordenação e filtros) de registros, inconsistências ou pacotes da sessão"""
+    session = AnalysisSession.query.get_or_404(session_id)
+    
+    # Verificar acesso
+    if session.user_id != current_user.id and current_user.role != 'admin':
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    if session.status != 'completed':
+        return jsonify({'error': 'Análise ainda não foi concluída'}), 409
+    
+    try:
+        dados = get_session_artifacts(session).pagina(tabela, *_page_args())
+        return jsonify(dados)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erro ao paginar {tabela} da sessão {session_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/sessions/<int:session_id>/search')
+@login_required
+def session_search(session_id):
+    """Busca incremental (por prefixo, sem acentos) de médicos, pacientes e procedimentos"""
+    session = AnalysisSession.query.get_or_404(session_id)
+    
+    # Verificar acesso
+    if session.user_id != current_user.id and current_user.role != 'admin':
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    if session.status != 'completed':
+        return jsonify({'error': 'Análise ainda não foi concluída'}), 409
+    
+    termo = request.args.get('q', '')
+    tipo = request.args.get('tipo') or None
+    limite = min(request.args.get('limit', 10, type=int), 50)
+    if tipo and tipo not in ('medico', 'paciente', 'procedimento'):
+        return jsonify({'error': f'Tipo de busca inválido: {tipo}'}), 400
+    
+    try:
+        indice = get_session_artifacts(session).indice_busca()
+        return jsonify({'q': termo, 'resultados': indice.buscar(termo, tipo, limite)})
+    except Exception as e:
+        logging.error(f"Erro na busca da sessão {session_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/sessions/<int:session_id>/pacientes/<path:usuario_codigo>')
+@login_required
+def patient_timeline(session_id, usuario_codigo):
+    """Linha do tempo de um paciente: sessões por mês, valores, pacotes e inconsistências"""
+    session = AnalysisSession.query.get_or_404(session_id)
+    
+    # Verificar acesso
+    if session.user_id != current_user.id and current_user.role != 'admin':
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    if session.status != 'completed':
+        return jsonify({'error': 'Análise ainda não foi concluída'}), 409
+    
+    try:
+        timeline = get_session_artifacts(session).linha_do_tempo(usuario_codigo)
+        if timeline is None:
+            return jsonify({'error': f'Paciente {usuario_codigo} não encontrado'}), 404
+        return jsonify(timeline)
+    except Exception as e:
+        logging.error(f"Erro ao montar linha do tempo do paciente {usuario_codigo}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _session_cache_key(session_id):
+    """Chave de cache das APIs de uma sessão (None se o usuário não tem acesso)"""
+    session = AnalysisSession.query.get(session_id)
+    if session is None or (session.user_id != current_user.id and current_user.role != 'admin'):
+        return None
+    return CacheKey([session.db_file_path, session.excel_file_path],
+                    {'session': session.id, 'status': session.status})
+
+def _report_cache_key(params=None):
+    """Chave de cache do relatório geral: sessão mais recente do usuário, planilha de Divinópolis e parâmetros"""
+    latest_session = _latest_completed_session()
+    if not latest_session:
+        return _app_db_cache_key(params)
+    return CacheKey([latest_session.db_file_path, latest_session.excel_file_path, find_divinopolis_excel()],
+                    dict(params or {}, session=latest_session.id))
+
+def _app_db_cache_key(params=None):
+    """Chave de cache das visões sobre a tabela producao do banco da aplicação
+
+    O banco da aplicação muda a cada sessão criada; em vez de hash do arquivo inteiro,
+    usa a impressão digital só da tabela producao e a planilha de Divinópolis usada.
+    """
+    return CacheKey([find_divinopolis_excel()],
+                    dict(params or {}, producao=table_fingerprint(DEFAULT_DB_PATH, 'producao')),
+                    use_mtime=False)
 
 @main_bp.route('/api/chart-data/<int:session_id>')
 @login_required
+@conditional(_session_cache_key)
 def chart_data(session_id):
     """API endpoint para dados dos gráficos"""
     session = AnalysisSession.query.get_or_404(session_id)
@@ -305,36 +639,24 @@ def chart_data(session_id):
         return jsonify({'error': 'Acesso negado'}), 403
     
     try:
-        # Dados por empresa
-        empresa_data = db.session.query(
-            ProcessedData.empresa,
-            db.func.sum(ProcessedData.valor_final).label('total')
-        ).filter_by(session_id=session_id).group_by(ProcessedData.empresa).all()
-        
-        # Dados por procedimento
-        procedimento_data = db.session.query(
-            ProcessedData.procedimento_nome,
-            db.func.sum(ProcessedData.valor_final).label('total')
-        ).filter_by(session_id=session_id).group_by(ProcessedData.procedimento_nome).all()
-        
-        # Dados por médico
-        medico_data = db.session.query(
-            ProcessedData.medico_nome,
-            db.func.sum(ProcessedData.valor_final).label('total')
-        ).filter_by(session_id=session_id).group_by(ProcessedData.medico_nome).all()
+        # Totais por empresa, procedimento e médico a partir dos resumos da sessão
+        resumos = get_session_results(session, ('resumo_por_empresa', 'resumo_por_especialidade', 'resumo_por_medico'))
+        empresa_data = resumos['resumo_por_empresa']
+        procedimento_data = resumos['resumo_por_especialidade']
+        medico_data = resumos['resumo_por_medico']
         
         return jsonify({
             'empresa': {
-                'labels': [item.empresa for item in empresa_data],
-                'data': [float(item.total) for item in empresa_data]
+                'labels': list(empresa_data),
+                'data': [item['valor'] for item in empresa_data.values()]
             },
             'procedimento': {
-                'labels': [item.procedimento_nome for item in procedimento_data],
-                'data': [float(item.total) for item in procedimento_data]
+                'labels': list(procedimento_data),
+                'data': [item['valor'] for item in procedimento_data.values()]
             },
             'medico': {
-                'labels': [item.medico_nome for item in medico_data],
-                'data': [float(item.total) for item in medico_data]
+                'labels': list(medico_data),
+                'data': [item['valor'] for item in medico_data.values()]
             }
         })
     
@@ -354,12 +676,12 @@ def delete_session(session_id):
             flash('Acesso negado para deletar esta análise.', 'error')
             return redirect(url_for('main.dashboard'))
         
-        # Deletar dados processados relacionados
-        ProcessedData.query.filter_by(session_id=session_id).delete()
-        
-        # Deletar a sessão
+        # Deletar a sessão; os dados processados ficam no arquivo próprio dela
+        artifacts_path = session.artifacts_path
         db.session.delete(session)
         db.session.commit()
+        invalidate_session(session_id)
+        remove_session_store(artifacts_path)
         
         flash(f'Análise #{session_id} deletada com sucesso.', 'success')
         logging.info(f"Usuário {current_user.username} deletou sessão {session_id}")
@@ -383,20 +705,11 @@ def view_pacotes(session_id):
         return redirect(url_for('main.dashboard'))
     
     try:
-        # Usar dados do arquivo carregado pelo usuário se disponível
-        if session.db_file_path:
-            processor = SAVIDataProcessor(session.db_file_path, session.excel_file_path)
-            logging.info(f"Carregando pacotes da sessão {session.id}: {session.database_filename}")
-        else:
-            processor = SAVIDataProcessor('instance/savi_assistant.db')
-            logging.info("Usando dados padrão para visualizar pacotes")
-            
-        df_producao = processor.load_data_from_sqlite()
-        pacotes = processor.business_logic.detectar_pacotes(df_producao)
+        artifacts = get_session_artifacts(session)
         
         return render_template('pacotes.html', 
                              session=session,
-                             pacotes=pacotes,
+                             resumo_pacotes=artifacts.resumo_pacotes(),
                              format_currency=format_currency)
     
     except Exception as e:
@@ -406,6 +719,7 @@ def view_pacotes(session_id):
 
 @main_bp.route('/api/dashboard-charts')
 @login_required
+@conditional(_app_db_cache_key)
 def dashboard_charts_data():
     """API endpoint para dados dos gráficos do dashboard principal"""
     try:
@@ -418,29 +732,31 @@ def dashboard_charts_data():
         
         # Calcular dados para o gráfico Divinópolis vs BH/Contagem
         divinopolis_data = dashboard_data.get('divinopolis', {})
-        valor_divinopolis = float(divinopolis_data.get('valor_faturado', 0) or 0)
-        valor_total = float(dashboard_data.get('resumo_financeiro', {}).get('total_faturado', 0) or 0)
+        valor_divinopolis = divinopolis_data.get('valor_faturado') or 0
+        valor_total = dashboard_data.get('resumo_financeiro', {}).get('total_faturado') or 0
         valor_bh_contagem = max(0, valor_total - valor_divinopolis)
         
         # Debug: Log dos valores calculados
-        logging.info(f"[API] Valor Divinópolis: R$ {valor_divinopolis:,.2f}")
-        logging.info(f"[API] Valor Total: R$ {valor_total:,.2f}")
-        logging.info(f"[API] Valor BH/Contagem: R$ {valor_bh_contagem:,.2f}")
+        logging.debug("[API] Valores regionais calculados", extra={'fields': {
+            'valor_divinopolis': valor_divinopolis,
+            'valor_total': valor_total,
+            'valor_bh_contagem': valor_bh_contagem,
+        }})
         
         # Preparar dados dos gráficos
         chart_data = {
             'empresas': {
                 'labels': list(dashboard_data.get('resumo_por_empresa', {}).keys()),
-                'data': [float(dados.get('valor', 0)) for dados in dashboard_data.get('resumo_por_empresa', {}).values()],
+                'data': [dados.get('valor', 0) for dados in dashboard_data.get('resumo_por_empresa', {}).values()],
                 'backgroundColor': ['#0d6efd', '#198754', '#dc3545', '#ffc107', '#6f42c1', '#fd7e14', '#20c997', '#e83e8c']
             },
             'especialidades': {
                 'labels': [esp[:20] + '...' if len(esp) > 20 else esp for esp in list(dashboard_data.get('resumo_por_especialidade', {}).keys())[:10]],
-                'data': [int(dados.get('sessoes', 0)) for dados in list(dashboard_data.get('resumo_por_especialidade', {}).values())[:10]]
+                'data': [dados.get('sessoes', 0) for dados in list(dashboard_data.get('resumo_por_especialidade', {}).values())[:10]]
             },
             'medicos_top': {
                 'labels': [med[:25] + '...' if len(med) > 25 else med for med in list(dashboard_data.get('resumo_por_medico', {}).keys())[:10]],
-                'data': [float(dados.get('valor', 0)) for dados in list(dashboard_data.get('resumo_por_medico', {}).values())[:10]]
+                'data': [dados.get('valor', 0) for dados in list(dashboard_data.get('resumo_por_medico', {}).values())[:10]]
             },
             'divinopolis_vs_bh': {
                 'labels': ['Divinópolis', 'BH/Contagem'],
@@ -471,34 +787,25 @@ def general_report():
 
 @main_bp.route('/api/general-report/filters')
 @login_required
+@conditional(lambda: _report_cache_key())
 def general_report_filters():
     """API endpoint para opções de filtros do relatório geral"""
     try:
         # Usar dados da sessão mais recente ou dados padrão
-        completed_sessions = AnalysisSession.query.filter_by(
-            user_id=current_user.id, status='completed'
-        ).order_by(AnalysisSession.created_at.desc()).all()
-        
-        if not completed_sessions:
-            processor = SAVIDataProcessor('instance/savi_assistant.db')
+        latest_session = _latest_completed_session()
+        
+        if latest_session and latest_session.valores_distintos:
+            valores = json.loads(latest_session.valores_distintos)
+        elif latest_session:
+            # Sessões anteriores ao dicionário de valores: calcular uma vez e gravar
+            valores = SAVIDataProcessor(latest_session.db_file_path).distinct_values()
+            latest_session.valores_distintos = json.dumps(valores, ensure_ascii=False)
+            db.session.commit()
         else:
-            latest_session = completed_sessions[0]
-            processor = SAVIDataProcessor(latest_session.db_file_path, latest_session.excel_file_path)
+            valores = SAVIDataProcessor('instance/savi_assistant.db').distinct_values()
         
-        df_producao = processor.load_data_from_sqlite()
-        
-        if df_producao.empty:
-            return jsonify({
-                'empresas': [],
-                'especialidades': [],
-                'medicos': []
-            })
-        
-        filters_data = {
-            'empresas': sorted(df_producao['empresa'].dropna().unique().tolist()),
-            'especialidades': sorted(df_producao['procedimento_nome'].dropna().unique().tolist()),
-            'medicos': sorted(df_producao['medico_nome'].dropna().unique().tolist())[:50]  # Limitar a 50 para performance
-        }
+        filters_data = {chave: list(contagens) for chave, contagens in valores.items()}
+        filters_data['contagens'] = valores
         
         return jsonify(filters_data)
         
@@ -506,37 +813,64 @@ def general_report_filters():
         logging.error(f"Erro ao carregar filtros do relatório geral: {e}")
         return jsonify({'error': str(e)}), 500
 
+REPORT_FILTER_KEYS = ('start_date', 'end_date', 'empresa', 'especialidade', 'medico', 'regiao', 'carteira')
+
+def _get_report_filters():
+    """Lê os filtros do relatório geral da query string, descartando os vazios"""
+    filters = {key: request.args.get(key) for key in REPORT_FILTER_KEYS}
+    return {k: v for k, v in filters.items() if v}
+
+def _latest_completed_session():
+    """Sessão concluída mais recente do usuário atual (ou None)"""
+    return AnalysisSession.query.filter_by(
+        user_id=current_user.id, status='completed'
+    ).order_by(AnalysisSession.created_at.desc()).first()
+
+def _latest_report_processor():
+    """Processador da sessão concluída mais recente do usuário (ou dados padrão)"""
+    latest_session = _latest_completed_session()
+    
+    if not latest_session:
+        return SAVIDataProcessor('instance/savi_assistant.db')
+    return SAVIDataProcessor(latest_session.db_file_path, latest_session.excel_file_path)
+
+def _apply_report_filters(df_producao, filters):
+    """Aplica os filtros do relatório geral mantendo as colunas originais"""
+    mask = pd.Series(True, index=df_producao.index)
+    
+    # Filtro de data
+    if filters.get('start_date') or filters.get('end_date'):
+        datas = pd.to_datetime(df_producao['data_execucao'], format='%d/%m/%Y', errors='coerce')
+        if filters.get('start_date'):
+            mask &= datas >= pd.to_datetime(filters['start_date'])
+        if filters.get('end_date'):
+            mask &= datas <= pd.to_datetime(filters['end_date'])
+    
+    # Outros filtros
+    if filters.get('empresa'):
+        mask &= df_producao['empresa'] == filters['empresa']
+    
+    if filters.get('especialidade'):
+        mask &= df_producao['procedimento_nome'] == filters['especialidade']
+    
+    if filters.get('medico'):
+        mask &= df_producao['medico_nome'] == filters['medico']
+    
+    # Filtro por região (requer lógica específica) - ainda não restringe os registros
+    
+    return df_producao[mask]
+
 @main_bp.route('/api/general-report/data')
 @login_required
+@conditional(lambda: _report_cache_key(_get_report_filters()))
 def general_report_data():
     """API endpoint para dados do dashboard interativo"""
     try:
-        # Obter filtros da query string
-        filters = {
-            'start_date': request.args.get('start_date'),
-            'end_date': request.args.get('end_date'),
-            'empresa': request.args.get('empresa'),
-            'especialidade': request.args.get('especialidade'),
-            'medico': request.args.get('medico'),
-            'regiao': request.args.get('regiao'),
-            'carteira': request.args.get('carteira')
-        }
-        
-        # Remover filtros vazios
-        filters = {k: v for k, v in filters.items() if v}
-        
-        logging.info(f"Aplicando filtros no relatório geral: {filters}")
+        filters = _get_report_filters()
+        logging.debug("Aplicando filtros no relatório geral", extra={'fields': filters})
         
         # Usar dados da sessão mais recente ou dados padrão
-        completed_sessions = AnalysisSession.query.filter_by(
-            user_id=current_user.id, status='completed'
-        ).order_by(AnalysisSession.created_at.desc()).all()
-        
-        if not completed_sessions:
-            processor = SAVIDataProcessor('instance/savi_assistant.db')
-        else:
-            latest_session = completed_sessions[0]
-            processor = SAVIDataProcessor(latest_session.db_file_path, latest_session.excel_file_path)
+        processor = _latest_report_processor()
         
         # Carregar e filtrar dados
         df_producao = processor.load_data_from_sqlite()
@@ -544,36 +878,7 @@ def general_report_data():
         if df_producao.empty:
             return jsonify({'error': 'Nenhum dado disponível'}), 404
         
-        # Aplicar filtros
-        df_filtered = df_producao.copy()
-        
-        # Filtro de data
-        if filters.get('start_date') or filters.get('end_date'):
-            df_filtered['data_execucao'] = pd.to_datetime(df_filtered['data_execucao'], format='%d/%m/%Y', errors='coerce')
-            
-            if filters.get('start_date'):
-                start_date = pd.to_datetime(filters['start_date'])
-                df_filtered = df_filtered[df_filtered['data_execucao'] >= start_date]
-            
-            if filters.get('end_date'):
-                end_date = pd.to_datetime(filters['end_date'])
-                df_filtered = df_filtered[df_filtered['data_execucao'] <= end_date]
-        
-        # Outros filtros
-        if filters.get('empresa'):
-            df_filtered = df_filtered[df_filtered['empresa'] == filters['empresa']]
-        
-        if filters.get('especialidade'):
-            df_filtered = df_filtered[df_filtered['procedimento_nome'] == filters['especialidade']]
-        
-        if filters.get('medico'):
-            df_filtered = df_filtered[df_filtered['medico_nome'] == filters['medico']]
-        
-        # Filtro por região (requer lógica específica)
-        if filters.get('regiao') == 'divinopolis':
-            divinopolis_data = processor._calculate_divinopolis_data(df_producao)
-            # Filtrar apenas usuários de Divinópolis se houver dados específicos
-            pass  # Implementar lógica específica se necessário
+        df_filtered = _apply_report_filters(df_producao, filters)
         
         # Processar dados filtrados
         resultado = processor.business_logic.process_faturamento(df_filtered, processor.excel_path)
@@ -621,8 +926,8 @@ def _calculate_faturamento_periodo(df):
             faturamento_mensal = df_periodo.groupby('mes_ano')['valor_unitario'].sum().sort_index()
             
             return {
-                'labels': [str(mes) for mes in faturamento_mensal.index],
-                'data': faturamento_mensal.values.tolist()
+                'labels': faturamento_mensal.index,
+                'data': faturamento_mensal.values
             }
         else:
             # Se não houver coluna de data, agrupar por mês atual
@@ -680,10 +985,10 @@ def _calculate_regional_data(processor, df_producao):
     """Calcular dados regionais (Divinópolis vs BH/Contagem)"""
     try:
         divinopolis_data = processor._calculate_divinopolis_data(df_producao)
-        valor_divinopolis = float(divinopolis_data.get('valor_faturado', 0))
+        valor_divinopolis = divinopolis_data.get('valor_faturado') or 0
         
         resultado = processor.business_logic.process_faturamento(df_producao, processor.excel_path)
-        valor_total = float(resultado['resumo_financeiro'].get('total_faturado', 0))
+        valor_total = resultado['resumo_financeiro'].get('total_faturado', 0)
         valor_bh_contagem = max(0, valor_total - valor_divinopolis)
         
         return {
@@ -710,43 +1015,43 @@ def _prepare_pacotes_data(pacotes_aplicados):
 @main_bp.route('/api/general-report/export')
 @login_required
 def export_general_report():
-    """Exportar relatório geral para Excel"""
+    """Exportar relatório geral filtrado para Excel (?format=xlsx, padrão) ou CSV (?format=csv)"""
     try:
-        # Obter filtros da query string
-        filters = {
-            'start_date': request.args.get('start_date'),
-            'end_date': request.args.get('end_date'),
-            'empresa': request.args.get('empresa'),
-            'especialidade': request.args.get('especialidade'),
-            'medico': request.args.get('medico'),
-            'regiao': request.args.get('regiao'),
-            'carteira': request.args.get('carteira')
-        }
+        formato = request.args.get('format', 'xlsx').lower()
+        if formato not in ('xlsx', 'csv'):
+            return jsonify({'error': 'Formato inválido. Use xlsx ou csv'}), 400
         
-        # Remover filtros vazios
-        filters = {k: v for k, v in filters.items() if v}
+        processor = _latest_report_processor()
+        df_producao = processor.load_data_from_sqlite()
         
-        # Usar ReportGenerator para exportar dados filtrados
-        completed_sessions = AnalysisSession.query.filter_by(
-            user_id=current_user.id, status='completed'
-        ).order_by(AnalysisSession.created_at.desc()).all()
+        if df_producao.empty:
+            return jsonify({'error': 'Nenhum dado disponível'}), 404
         
-        if not completed_sessions:
-            processor = SAVIDataProcessor('instance/savi_assistant.db')
-        else:
-            latest_session = completed_sessions[0]
-            processor = SAVIDataProcessor(latest_session.db_file_path, latest_session.excel_file_path)
+        # Mesmos filtros de /api/general-report/data
+        df_filtered = _apply_report_filters(df_producao, _get_report_filters())
+        del df_producao
+        resultado = processor.business_logic.process_faturamento(df_filtered, processor.excel_path)
         
-        report_generator = ReportGenerator(processor)
+        nome_arquivo = f"relatorio_geral_{datetime.now().strftime('%Y-%m-%d')}"
         
-        # Aplicar filtros e gerar relatório
-        df_filtered = processor.load_data_from_sqlite()
+        if formato == 'csv':
+            return Response(iter_csv(resultado['dados_processados']),
+                            mimetype='text/csv',
+                            headers={'Content-Disposition': f'attachment; filename={nome_arquivo}.csv'})
         
-        # Aplicar filtros (mesmo código da função anterior)
-        # ... código de filtros ...
+        # Workbook write-only gravado em arquivo temporário e enviado a partir do disco
+        fd, caminho = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            write_xlsx(resultado, resultado['dados_processados'], caminho)
+        except Exception:
+            os.remove(caminho)
+            raise
         
-        # Por enquanto, retornar erro indicando funcionalidade em desenvolvimento
-        return jsonify({'error': 'Funcionalidade de exportação em desenvolvimento'}), 501
+        response = send_file(caminho, as_attachment=True, download_name=f'{nome_arquivo}.xlsx',
+                             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response.call_on_close(lambda: os.remove(caminho))
+        return response
         
     except Exception as e:
         logging.error(f"Erro ao exportar relatório geral: {e}")
@@ -761,8 +1066,12 @@ def cleanup():
         return redirect(url_for('main.dashboard'))
     
     try:
-        cleanup_old_files()
-        flash('Limpeza de arquivos realizada com sucesso.', 'success')
+        relatorio = cleanup_old_files()
+        if relatorio is None:
+            flash('Limpeza de arquivos já em andamento.', 'info')
+        else:
+            flash(f"Limpeza de arquivos realizada: {len(relatorio['removidos'])} arquivo(s) removido(s), "
+                  f"{relatorio['liberados'] / (1024 * 1024):.1f} MB liberados.", 'success')
     except Exception as e:
         flash(f'Erro na limpeza: {str(e)}', 'error')
     
@@ -785,18 +1094,11 @@ def relatorio_divinopolis(session_id):
             flash('Arquivo Excel de Divinópolis não encontrado para esta sessão.', 'error')
             return redirect(url_for('main.analysis', session_id=session_id))
         
-        # Gerar relatório usando o módulo específico
-        from divinopolis_report import DivinopolisReportGenerator
-        
-        report_generator = DivinopolisReportGenerator(
-            session.db_file_path, 
-            session.excel_file_path
-        )
-        
-        report_data = report_generator.generate_report()
-        
-        if report_data['status'] == 'error':
-            flash(f'Erro ao gerar relatório: {report_data["message"]}', 'error')
+        # Relatório gerado uma vez por conteúdo; listas longas são paginadas pela API abaixo
+        try:
+            report_data = get_divinopolis_artifacts(session).resultado
+        except ValueError as e:
+            flash(f'Erro ao gerar relatório: {e}', 'error')
             return redirect(url_for('main.analysis', session_id=session_id))
         
         return render_template('relatorio_divinopolis.html', 
@@ -808,14 +1110,166 @@ def relatorio_divinopolis(session_id):
         flash(f'Erro interno: {str(e)}', 'error')
         return redirect(url_for('main.dashboard'))
 
+@main_bp.route('/api/relatorio-divinopolis/<int:session_id>/<any(procedimentos, medicos, nao_encontrados):tabela>')
+@login_required
+def divinopolis_table_page(session_id, tabela):
+    """API paginada das listas do relatório de Divinópolis (procedimentos, médicos, usuários não encontrados)"""
+    session = AnalysisSession.query.get_or_404(session_id)
+    
+    # Verificar acesso
+    if session.user_id != current_user.id and current_user.role != 'admin':
+        return jsonify({'error': 'Acesso negado'}), 403
+    
+    if not session.excel_file_path or not os.path.exists(session.excel_file_path):
+        return jsonify({'error': 'Arquivo Excel de Divinópolis não encontrado para esta sessão'}), 404
+    
+    try:
+        dados = get_divinopolis_artifacts(session).pagina(f'divinopolis_{tabela}', *_page_args())
+        return jsonify(dados)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Erro ao paginar {tabela} do relatório de Divinópolis da sessão {session_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @main_bp.route('/sessions')
 @login_required
 def sessions():
-    """Lista todas as sessões do usuário"""
+    """Lista as sessões do usuário (todas para admin), paginadas por cursor (created_at, id)"""
+    por_pagina = current_app.config['SESSIONS_PER_PAGE']
+    query = AnalysisSession.query
+    if current_user.role == 'admin':
+        query = query.options(db.joinedload(AnalysisSession.user))
+    else:
+        query = query.filter(AnalysisSession.user_id == current_user.id)
+    
+    cursor = _parse_session_cursor(request.args.get('cursor'))
+    if cursor:
+        created_at, session_id = cursor
+        query = query.filter(db.or_(
+            AnalysisSession.created_at < created_at,
+            db.and_(AnalysisSession.created_at == created_at, AnalysisSession.id < session_id)
+        ))
+    
+    page_sessions = query.order_by(AnalysisSession.created_at.desc(), AnalysisSession.id.desc())\
+                         .limit(por_pagina + 1).all()
+    next_cursor = None
+    if len(page_sessions) > por_pagina:
+        page_sessions = page_sessions[:por_pagina]
+        ultima = page_sessions[-1]
+        next_cursor = f"{ultima.created_at.isoformat()}_{ultima.id}"
+    
+    return render_template('sessions.html', sessions=page_sessions, next_cursor=next_cursor,
+                           first_page=cursor is None, format_currency=format_currency)
+
+@main_bp.route('/consolidated')
+@login_required
+def consolidated():
+    """Análise consolidada de várias sessões concluídas (ex.: acumulado do ano, várias operadoras)"""
+    ids = sorted(set(request.args.getlist('sessions', type=int)))
+    limite = current_app.config['CONSOLIDATED_MAX_SESSIONS']
+    opcoes = _completed_session_options(ids)
+    resultado = None
+    fontes = []
+    
+    if len(ids) > limite:
+        flash(f'Selecione no máximo {limite} análises para consolidar.', 'error')
+    elif ids:
+        selecionadas = [s for s in opcoes if s.id in ids]
+        if len(selecionadas) != len(ids):
+            flash('Análise não encontrada, não concluída ou sem acesso.', 'error')
+        else:
+            try:
+                resultado = get_consolidated_artifacts(selecionadas).resultado
+                fontes = fontes_por_sessao(selecionadas, resultado['consolidacao'])
+            except Exception as e:
+                logging.error(f"Erro na análise consolidada das sessões {ids}: {e}")
+                flash(f'Erro ao consolidar análises: {str(e)}', 'error')
+    
+    return render_template('consolidated.html', opcoes=opcoes, selecionadas=ids, resultado=resultado,
+                           fontes=fontes, limite=limite, format_currency=format_currency)
+
+@main_bp.route('/compare')
+@login_required
+def compare_sessions():
+    """Comparação entre duas análises concluídas (base -> atual) a partir dos resumos já calculados"""
+    base_id = request.args.get('base', type=int)
+    atual_id = request.args.get('atual', type=int)
+    opcoes = _completed_session_options([i for i in (base_id, atual_id) if i])
+    comparacao = None
+    
+    if base_id and atual_id:
+        sessoes = {s.id: s for s in opcoes}
+        if base_id not in sessoes or atual_id not in sessoes:
+            flash('Análise não encontrada, não concluída ou sem acesso.', 'error')
+        else:
+            try:
+                comparacao = _compare_sessions(sessoes[base_id], sessoes[atual_id])
+            except Exception as e:
+                logging.error(f"Erro ao comparar sessões {base_id} e {atual_id}: {e}")
+                flash(f'Erro ao comparar análises: {str(e)}', 'error')
+    elif len(opcoes) >= 2:
+        # Sugestão padrão: análise mais recente contra a anterior
+        base_id, atual_id = opcoes[1].id, opcoes[0].id
+    
+    return render_template('compare.html', opcoes=opcoes, base_id=base_id, atual_id=atual_id,
+                           comparacao=comparacao, format_currency=format_currency)
+
+def _compare_cache_key(base_id, atual_id):
+    """Chave de cache da comparação: arquivos das duas sessões (None sem acesso)"""
+    chaves = [_session_cache_key(base_id), _session_cache_key(atual_id)]
+    if None in chaves:
+        return None
+    return CacheKey(chaves[0].paths + chaves[1].paths, {'base': chaves[0].params, 'atual': chaves[1].params})
+
+@main_bp.route('/api/compare/<int:base_id>/<int:atual_id>')
+@login_required
+@conditional(_compare_cache_key)
+def compare_sessions_data(base_id, atual_id):
+    """API da comparação entre duas sessões: deltas financeiros, de pacotes e por dimensão"""
+    base = AnalysisSession.query.get_or_404(base_id)
+    atual = AnalysisSession.query.get_or_404(atual_id)
+    
+    for session in (base, atual):
+        if session.user_id != current_user.id and current_user.role != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        if session.status != 'completed':
+            return jsonify({'error': f'Análise #{session.id} não foi concluída'}), 409
+    
+    try:
+        return jsonify(_compare_sessions(base, atual))
+    except Exception as e:
+        logging.error(f"Erro ao comparar sessões {base_id} e {atual_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def _compare_sessions(base, atual):
+    comparacao = compare_results(get_session_results(base, CHAVES_COMPARACAO),
+                                 get_session_results(atual, CHAVES_COMPARACAO))
+    comparacao['base'] = {'id': base.id, 'arquivo': base.database_filename, 'criado_em': base.created_at}
+    comparacao['atual'] = {'id': atual.id, 'arquivo': atual.database_filename, 'criado_em': atual.created_at}
+    return comparacao
+
+def _completed_session_options(incluir_ids=()):
+    """Sessões concluídas visíveis ao usuário (todas para admin) mais recentes, incluindo as já escolhidas"""
+    query = AnalysisSession.query.filter_by(status='completed')
     if current_user.role == 'admin':
-        all_sessions = AnalysisSession.query.order_by(AnalysisSession.created_at.desc()).all()
+        query = query.options(db.joinedload(AnalysisSession.user))
     else:
-        all_sessions = AnalysisSession.query.filter_by(user_id=current_user.id)\
-                                           .order_by(AnalysisSession.created_at.desc()).all()
+        query = query.filter(AnalysisSession.user_id == current_user.id)
     
-    return render_template('sessions.html', sessions=all_sessions, format_currency=format_currency)
+    opcoes = query.order_by(AnalysisSession.created_at.desc(), AnalysisSession.id.desc())\
+                  .limit(current_app.config['DASHBOARD_SESSION_OPTIONS']).all()
+    faltando = set(incluir_ids) - {s.id for s in opcoes}
+    if faltando:
+        opcoes += query.filter(AnalysisSession.id.in_(faltando)).all()
+    return opcoes
+
+def _parse_session_cursor(valor):
+    """Cursor 'created_at_id' da listagem de sessões (None se ausente ou inválido)"""
+    if not valor:
+        return None
+    try:
+        created_at, session_id = valor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(session_id)
+    except ValueError:
+        return None
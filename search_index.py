@@ -0,0 +1,68 @@
+"""
+Índice de prefixos para busca incremental (typeahead) de médicos, pacientes e procedimentos
+
+As chaves são normalizadas (sem acentos, minúsculas) e mantidas em uma lista ordenada;
+a busca localiza o intervalo do prefixo com bisect em O(log n).
+"""
+
+import bisect
+import unicodedata
+
+
+def normalizar(texto):
+    """Remove acentos, converte para minúsculas e colapsa espaços"""
+    if texto is None:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+class PrefixIndex:
+    """Lista ordenada de (chave, tipo, valor, rótulo) indexando o início de cada palavra"""
+
+    def __init__(self):
+        self._entradas = []
+        self._chaves = []
+
+    def adicionar(self, tipo, valor, rotulo, textos):
+        """Indexa um item pelos textos informados (nome, código...) e por cada palavra deles"""
+        vistos = set()
+        for texto in textos:
+            palavras = normalizar(texto).split(' ')
+            for i in range(len(palavras)):
+                chave = ' '.join(palavras[i:])
+                if chave and chave not in vistos:
+                    vistos.add(chave)
+                    self._entradas.append((chave, tipo, valor, rotulo))
+
+    def construir(self):
+        """Ordena as entradas; deve ser chamado após as inclusões"""
+        self._entradas.sort()
+        self._chaves = [entrada[0] for entrada in self._entradas]
+        return self
+
+    def buscar(self, termo, tipo=None, limite=10):
+        """Itens cujo nome/código (ou alguma palavra) começa com o termo"""
+        prefixo = normalizar(termo)
+        if not prefixo:
+            return []
+
+        inicio = bisect.bisect_left(self._chaves, prefixo)
+        fim = bisect.bisect_left(self._chaves, prefixo + '\uffff', lo=inicio)
+
+        resultados, vistos = [], set()
+        for i in range(inicio, fim):
+            _, tipo_item, valor, rotulo = self._entradas[i]
+            if tipo and tipo_item != tipo:
+                continue
+            if (tipo_item, valor) in vistos:
+                continue
+            vistos.add((tipo_item, valor))
+            resultados.append({'tipo': tipo_item, 'valor': valor, 'rotulo': rotulo})
+            if len(resultados) >= limite:
+                break
+        return resultados
+
+    def __len__(self):
+        return len(self._entradas)
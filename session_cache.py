@@ -0,0 +1,393 @@
+"""
+Cache em memória dos resultados processados por sessão de análise
+
+Cada sessão concluída é processada uma única vez por worker; as tabelas derivadas
+(registros, inconsistências, pacotes) e suas ordenações são calculadas sob demanda
+e reaproveitadas pelas consultas paginadas. A chave é o conteúdo (arquivos de origem),
+então sessões criadas a partir dos mesmos arquivos compartilham os artefatos. Sessões
+com arquivo de resultados (session_store) são carregadas dele em vez de reprocessadas.
+Análises consolidadas (várias sessões) usam o mesmo cache, pela chave de todas elas,
+assim como o relatório de Divinópolis de cada sessão.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from consolidation import ordem_das_fontes, process_consolidated
+from data_processor import SAVIDataProcessor
+from divinopolis_report import DivinopolisReportGenerator
+from search_index import PrefixIndex
+from session_store import load_session_store, read_session_results
+from upload_janitor import touch_upload
+
+# Colunas permitidas para ordenação e filtro em cada tabela paginada
+TABELAS = {
+    'registros': (
+        'empresa', 'data_execucao', 'usuario_codigo', 'usuario_nome', 'medico_nome',
+        'procedimento_codigo', 'procedimento_nome', 'qtde_realizada', 'valor_unitario',
+    ),
+    'inconsistencias': (
+        'registro_id', 'empresa', 'procedimento_nome', 'usuario_codigo', 'usuario_nome',
+        'data_execucao', 'motivo',
+    ),
+    'pacotes': (
+        'usuario_codigo', 'usuario_nome', 'mes_ano', 'quantidade_sessoes', 'tipo_pacote', 'valor_pacote',
+    ),
+    # Relatório de Divinópolis (get_divinopolis_artifacts)
+    'divinopolis_procedimentos': ('procedimento', 'usuarios_unicos', 'total_sessoes', 'valor_total', 'valor_medio'),
+    'divinopolis_medicos': ('medico', 'usuarios_unicos', 'total_sessoes', 'valor_total', 'valor_medio'),
+    'divinopolis_nao_encontrados': ('codigo',),
+}
+
+# Tabelas do relatório de Divinópolis -> chave da lista no relatório
+TABELAS_DIVINOPOLIS = {
+    'divinopolis_procedimentos': 'faturamento_por_procedimento',
+    'divinopolis_medicos': 'faturamento_por_medico',
+}
+
+MAX_POR_PAGINA = 500
+
+# Base usada quando a sessão não tem arquivo próprio carregado
+DEFAULT_DB_PATH = 'instance/savi_assistant.db'
+
+
+class SessionArtifacts:
+    """Resultado de process_faturamento de uma sessão com tabelas e ordenações em cache"""
+
+    def __init__(self, resultado):
+        self.resultado = resultado
+        self._tabelas = {}
+        self._ordens = {}
+        self._indice_busca = None
+        self._indice_pacientes = None
+        self._lock = threading.Lock()
+
+    def tabela(self, nome):
+        """DataFrame da tabela (índice posicional 0..n-1)"""
+        if nome not in self._tabelas:
+            if nome == 'registros':
+                df = self.resultado['dados_processados'].frame.reset_index(drop=True)
+            elif nome == 'inconsistencias':
+                df = pd.DataFrame(self.resultado['inconsistencias'])
+            elif nome == 'pacotes':
+                df = pd.DataFrame(self.resultado['pacotes_aplicados'])
+                df = df.drop(columns=['sessoes_ids'], errors='ignore')
+            elif nome in TABELAS_DIVINOPOLIS:
+                df = pd.DataFrame(self.resultado[TABELAS_DIVINOPOLIS[nome]], columns=TABELAS[nome])
+            elif nome == 'divinopolis_nao_encontrados':
+                df = pd.DataFrame({'codigo': sorted(self.resultado['usuarios_nao_encontrados'])})
+            else:
+                raise ValueError(f"Tabela desconhecida: {nome}")
+            with self._lock:
+                self._tabelas.setdefault(nome, df)
+        return self._tabelas[nome]
+
+    def ordem(self, nome, coluna, descendente=False):
+        """Posições da tabela ordenadas por coluna (ordenação estável, calculada uma vez)"""
+        chave = (nome, coluna, descendente)
+        if chave not in self._ordens:
+            df = self.tabela(nome)
+            valores = df[coluna]
+            if coluna == 'data_execucao':
+                valores = pd.to_datetime(valores, format='%d/%m/%Y', errors='coerce')
+            posicoes = valores.sort_values(ascending=not descendente, kind='mergesort',
+                                           na_position='last').index.to_numpy()
+            with self._lock:
+                self._ordens.setdefault(chave, posicoes)
+        return self._ordens[chave]
+
+    def pagina(self, nome, pagina=1, por_pagina=50, ordenar=None, descendente=False, filtros=None):
+        """Página da tabela com filtros de igualdade, cortada de uma ordenação pré-calculada"""
+        colunas = TABELAS.get(nome)
+        if colunas is None:
+            raise ValueError(f"Tabela desconhecida: {nome}")
+        if ordenar and ordenar not in colunas:
+            raise ValueError(f"Ordenação não permitida: {ordenar}")
+        filtros = filtros or {}
+        invalidos = [c for c in filtros if c not in colunas]
+        if invalidos:
+            raise ValueError(f"Filtros não permitidos: {', '.join(invalidos)}")
+
+        df = self.tabela(nome)
+        pagina = max(int(pagina), 1)
+        por_pagina = min(max(int(por_pagina), 1), MAX_POR_PAGINA)
+
+        if df.empty:
+            posicoes = np.arange(0)
+        elif ordenar:
+            posicoes = self.ordem(nome, ordenar, descendente)
+        else:
+            posicoes = np.arange(len(df))
+            if descendente:
+                posicoes = posicoes[::-1]
+
+        if filtros and len(posicoes):
+            mask = np.ones(len(df), dtype=bool)
+            for coluna, valor in filtros.items():
+                if coluna in df.columns:
+                    mask &= (df[coluna].astype(str) == str(valor)).to_numpy()
+                else:
+                    mask[:] = False
+            posicoes = posicoes[mask[posicoes]]
+
+        total = len(posicoes)
+        inicio = (pagina - 1) * por_pagina
+        recorte = df.iloc[posicoes[inicio:inicio + por_pagina]]
+        itens = recorte.to_dict('records')
+
+        return {
+            'items': itens,
+            'total': total,
+            'page': pagina,
+            'per_page': por_pagina,
+            'pages': (total + por_pagina - 1) // por_pagina,
+            'sort': ordenar,
+            'order': 'desc' if descendente else 'asc',
+        }
+
+    def indice_busca(self):
+        """Índice de prefixos de médicos, pacientes (nome e código) e procedimentos"""
+        if self._indice_busca is None:
+            df = self.tabela('registros')
+            # Linhas sintéticas de pacote (médico SISTEMA) não entram na busca
+            if 'procedimento_codigo' in df.columns:
+                df = df[df['procedimento_codigo'] != 'PACOTE']
+            indice = PrefixIndex()
+            if not df.empty:
+                for nome in df['medico_nome'].dropna().unique():
+                    indice.adicionar('medico', nome, nome, [nome])
+                for nome in df['procedimento_nome'].dropna().unique():
+                    indice.adicionar('procedimento', nome, nome, [nome])
+                pacientes = df[['usuario_codigo', 'usuario_nome']].dropna(subset=['usuario_codigo'])
+                for codigo, nome in pacientes.drop_duplicates('usuario_codigo').itertuples(index=False):
+                    # Nome ausente (NaN/None/vazio): indexa só o código, sem "nan" no rótulo nem na busca
+                    nome = str(nome).strip() if pd.notna(nome) else ''
+                    if nome:
+                        indice.adicionar('paciente', codigo, f"{nome} ({codigo})", [nome, codigo])
+                    else:
+                        indice.adicionar('paciente', codigo, str(codigo), [codigo])
+            with self._lock:
+                if self._indice_busca is None:
+                    self._indice_busca = indice.construir()
+        return self._indice_busca
+
+    def indice_pacientes(self):
+        """Registros e pacotes ordenados por paciente, com os códigos para busca binária"""
+        if self._indice_pacientes is None:
+            df = self.tabela('registros')
+            resultado = self.resultado
+
+            # Marcar sessões absorvidas por pacotes e inconsistências (ids = posição do registro)
+            em_pacote = np.zeros(len(df), dtype=bool)
+            ids = [i for pacote in resultado['pacotes_aplicados'] for i in pacote['sessoes_ids'] if i < len(df)]
+            em_pacote[ids] = True
+            motivos = pd.Series({inc['registro_id']: inc['motivo'] for inc in resultado['inconsistencias']},
+                                dtype=object)
+
+            frame = df.assign(em_pacote=em_pacote, inconsistencia=motivos.reindex(df.index))
+            frame.index.name = 'registro_id'
+            frame = frame.reset_index()
+            if not frame.empty:
+                frame = frame[frame['procedimento_codigo'] != 'PACOTE']
+            datas = pd.to_datetime(frame['data_execucao'], format='%d/%m/%Y', errors='coerce')
+            frame = frame.assign(_codigo=frame['usuario_codigo'].astype(str), _data=datas,
+                                 mes_ano=datas.dt.strftime('%Y-%m'))
+            frame = frame.sort_values(['_codigo', '_data'], kind='mergesort').reset_index(drop=True)
+
+            pacotes = self.tabela('pacotes')
+            if not pacotes.empty:
+                pacotes = pacotes.assign(_codigo=pacotes['usuario_codigo'].astype(str))
+                pacotes = pacotes.sort_values(['_codigo', 'mes_ano'], kind='mergesort').reset_index(drop=True)
+            else:
+                pacotes = pacotes.assign(_codigo=pd.Series(dtype=object))
+
+            indice = (frame, frame['_codigo'].to_numpy(), pacotes, pacotes['_codigo'].to_numpy())
+            with self._lock:
+                if self._indice_pacientes is None:
+                    self._indice_pacientes = indice
+        return self._indice_pacientes
+
+    def linha_do_tempo(self, usuario_codigo):
+        """Sessões mês a mês de um paciente com valores, pacotes e inconsistências (None se ausente)"""
+        frame, codigos, pacotes, codigos_pacotes = self.indice_pacientes()
+        codigo = str(usuario_codigo)
+
+        inicio, fim = np.searchsorted(codigos, codigo, 'left'), np.searchsorted(codigos, codigo, 'right')
+        if inicio == fim:
+            return None
+        registros = frame.iloc[inicio:fim]
+        p_inicio = np.searchsorted(codigos_pacotes, codigo, 'left')
+        p_fim = np.searchsorted(codigos_pacotes, codigo, 'right')
+        pacotes_paciente = {p['mes_ano']: p for p in
+                            pacotes.iloc[p_inicio:p_fim].drop(columns='_codigo').to_dict('records')}
+
+        colunas = ['registro_id', 'data_execucao', 'empresa', 'medico_nome', 'procedimento_codigo',
+                   'procedimento_nome', 'valor_unitario', 'em_pacote', 'inconsistencia']
+        meses = []
+        for mes_ano, grupo in registros.groupby('mes_ano', sort=True, dropna=False):
+            mes_ano = mes_ano if isinstance(mes_ano, str) else None
+            linhas = grupo[colunas]
+            meses.append({
+                'mes_ano': mes_ano,
+                'sessoes': len(grupo),
+                'valor_sessoes': round(grupo['valor_unitario'].sum(), 2),
+                'sessoes_em_pacote': grupo['em_pacote'].sum(),
+                'inconsistencias': grupo['inconsistencia'].notna().sum(),
+                'pacote': pacotes_paciente.get(mes_ano),
+                'registros': linhas.to_dict('records'),
+            })
+
+        valor_pacotes = sum(p['valor_pacote'] for p in pacotes_paciente.values())
+        return {
+            'usuario_codigo': codigo,
+            'usuario_nome': registros['usuario_nome'].iloc[0],
+            'resumo': {
+                'sessoes': fim - inicio,
+                'pacotes': len(pacotes_paciente),
+                'inconsistencias': sum(m['inconsistencias'] for m in meses),
+                'valor_total': round(registros['valor_unitario'].sum() + valor_pacotes, 2),
+            },
+            'meses': meses,
+        }
+
+    def resumo_pacotes(self):
+        """Contagens e valor total dos pacotes para os cards de resumo"""
+        return resumo_pacotes(self.resultado['pacotes_aplicados'])
+
+
+def resumo_pacotes(pacotes):
+    """Total, comuns, especiais e valor dos pacotes aplicados"""
+    especiais = sum(1 for p in pacotes if p['tipo_pacote'] == 'especial')
+    return {
+        'total': len(pacotes),
+        'comuns': len(pacotes) - especiais,
+        'especiais': especiais,
+        'valor_total': sum(p['valor_pacote'] for p in pacotes),
+    }
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_build_locks = {}
+# Sessão -> chave de conteúdo usada por ela
+_sessoes = {}
+
+
+def _cache_size():
+    return int(os.environ.get('SESSION_CACHE_SIZE', 4))
+
+
+def _chave(session):
+    db_path = session.db_file_path or DEFAULT_DB_PATH
+    excel_path = session.excel_file_path
+    return (os.path.realpath(db_path), excel_path and os.path.realpath(excel_path), os.path.getmtime(db_path))
+
+
+def _guardar(chave, artifacts):
+    _cache[chave] = artifacts
+    _cache.move_to_end(chave)
+    while len(_cache) > _cache_size():
+        _cache.popitem(last=False)
+
+
+def store_session_artifacts(session, resultado):
+    """Guarda o resultado já processado (ex.: no upload) para as próximas consultas"""
+    chave = _chave(session)
+    with _cache_lock:
+        _sessoes[session.id] = chave
+        _guardar(chave, SessionArtifacts(resultado))
+
+
+def get_session_artifacts(session):
+    """Retorna (processando se necessário) os artefatos de uma AnalysisSession concluída"""
+    db_path = session.db_file_path or DEFAULT_DB_PATH
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Arquivo de dados da sessão {session.id} não encontrado")
+
+    chave = _chave(session)
+    touch_upload(db_path)
+    touch_upload(session.excel_file_path)
+
+    with _cache_lock:
+        _sessoes[session.id] = chave
+
+    def construir():
+        if session.artifacts_path and os.path.exists(session.artifacts_path):
+            return load_session_store(session.artifacts_path)
+        processor = SAVIDataProcessor(db_path, session.excel_file_path)
+        return processor.process_analysis_session(session.id)
+
+    return _obter(chave, construir)
+
+
+def get_consolidated_artifacts(sessions):
+    """Artefatos da análise consolidada de várias sessões (chave = conteúdo de todas elas)"""
+    for session in sessions:
+        if not session.db_file_path or not os.path.exists(session.db_file_path):
+            raise FileNotFoundError(f"Arquivo de dados da sessão {session.id} não encontrado")
+    # Na ordem de precedência: os mesmos arquivos em outra ordem deduplicam de outro jeito
+    chave = ('consolidado',) + tuple(_chave(s) for s in ordem_das_fontes(sessions))
+    return _obter(chave, lambda: process_consolidated(sessions))
+
+
+def get_divinopolis_artifacts(session):
+    """Relatório de Divinópolis da sessão (planilha x banco), gerado uma vez por conteúdo"""
+    chave = ('divinopolis',) + _chave(session)
+
+    def construir():
+        relatorio = DivinopolisReportGenerator(session.db_file_path, session.excel_file_path).generate_report()
+        # Erros não vão para o cache: a próxima requisição tenta de novo
+        if relatorio['status'] == 'error':
+            raise ValueError(relatorio['message'])
+        return relatorio
+
+    return _obter(chave, construir)
+
+
+def _obter(chave, construir):
+    with _cache_lock:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            return _cache[chave]
+        build_lock = _build_locks.setdefault(chave, threading.Lock())
+
+    # Apenas uma thread processa cada conteúdo; as demais aguardam o resultado
+    with build_lock:
+        with _cache_lock:
+            if chave in _cache:
+                return _cache[chave]
+
+        try:
+            artifacts = SessionArtifacts(construir())
+            with _cache_lock:
+                _guardar(chave, artifacts)
+        finally:
+            # Também em caso de erro: o lock não pode ficar preso à chave para sempre
+            with _cache_lock:
+                _build_locks.pop(chave, None)
+        return artifacts
+
+
+def get_session_results(session, chaves):
+    """Partes leves do resultado (resumos, pacotes...) sem carregar os registros quando possível"""
+    with _cache_lock:
+        chave = _sessoes.get(session.id)
+        if chave in _cache:
+            resultado = _cache[chave].resultado
+            return {nome: resultado[nome] for nome in chaves}
+    if session.artifacts_path and os.path.exists(session.artifacts_path):
+        return read_session_results(session.artifacts_path, chaves)
+    resultado = get_session_artifacts(session).resultado
+    return {nome: resultado[nome] for nome in chaves}
+
+
+def invalidate_session(session_id):
+    """Remove do cache os artefatos de uma sessão (ex.: ao deletá-la), se nenhuma outra os usa"""
+    with _cache_lock:
+        chave = _sessoes.pop(session_id, None)
+        if chave is not None and chave not in _sessoes.values():
+            _cache.pop(chave, None)
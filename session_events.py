@@ -0,0 +1,82 @@
+"""
+Status e progresso do processamento das sessões para SSE e long-polling
+
+O processamento publica eventos (status e etapa corrente) em um registro em memória;
+os streams aguardam novas versões com threading.Condition em vez de consultar o banco
+em intervalos fixos. Entre processos (vários workers) o status do banco continua sendo
+a fonte de verdade e é reconsultado a cada keepalive.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Etapas do pipeline (nomes de profiling.stage) na ordem em que ocorrem
+ETAPAS = (
+    'load_sqlite',
+    'valores_distintos',
+    'perfil_qualidade',
+    'load_excel',
+    'detectar_pacotes',
+    'aplicar_pacotes',
+    'validar_empresa_procedimento',
+    'gerar_resumos',
+)
+
+STATUS_FINAIS = ('completed', 'error')
+
+
+class SessionEventBroker:
+    """Último estado publicado por sessão, com versão incremental para quem aguarda"""
+
+    def __init__(self, max_sessions=256):
+        self.max_sessions = max_sessions
+        self._estados = OrderedDict()
+        self._cond = threading.Condition()
+
+    def publish(self, session_id, **campos):
+        with self._cond:
+            anterior = self._estados.pop(session_id, {'version': 0})
+            estado = dict(anterior, **campos)
+            estado['version'] = anterior['version'] + 1
+            self._estados[session_id] = estado
+            while len(self._estados) > self.max_sessions:
+                self._estados.popitem(last=False)
+            self._cond.notify_all()
+
+    def publish_stage(self, session_id, etapa):
+        progresso = None
+        if etapa in ETAPAS:
+            progresso = round(100 * ETAPAS.index(etapa) / len(ETAPAS))
+        self.publish(session_id, status='processing', stage=etapa, progress=progresso)
+
+    def get(self, session_id):
+        with self._cond:
+            estado = self._estados.get(session_id)
+            return dict(estado) if estado else None
+
+    def wait(self, session_id, version=0, timeout=15.0):
+        """Aguarda um estado com versão maior que version (None em caso de timeout)"""
+        limite = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                estado = self._estados.get(session_id)
+                if estado and estado['version'] > version:
+                    return dict(estado)
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return None
+                self._cond.wait(restante)
+
+
+broker = SessionEventBroker()
+
+
+def format_sse(dados, evento=None):
+    """Formata uma mensagem Server-Sent Events"""
+    linhas = []
+    if evento:
+        linhas.append(f"event: {evento}")
+    linhas.append(f"data: {json.dumps(dados, ensure_ascii=False, default=str)}")
+    return '\n'.join(linhas) + '\n\n'
@@ -0,0 +1,96 @@
+"""
+Arquivo próprio (SQLite) com os resultados processados de cada sessão de análise
+
+Cada sessão concluída grava seus resultados em SESSION_STORE_FOLDER/<id>.db em vez de
+linhas no banco da aplicação: a tabela 'registros' guarda o DataFrame processado e a
+tabela 'resultado' guarda resumos, pacotes, inconsistências e perfis como JSON. O arquivo
+é escrito uma única vez (temporário + rename) e depois só lido, então é aberto como
+imutável pelo sqlite_pool; deletar a sessão é apenas remover o arquivo.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+
+from business_logic import RegistrosProcessados
+from sqlite_pool import discard, readonly_connection
+
+# Chaves do resultado de process_faturamento guardadas como JSON
+CHAVES_RESULTADO = (
+    'resumo_financeiro', 'resumo_por_empresa', 'resumo_por_especialidade', 'resumo_por_medico',
+    'resumo_por_paciente', 'pacotes_aplicados', 'inconsistencias', 'valores_distintos',
+    'perfil_qualidade',
+)
+
+
+def store_path(store_folder, session_id):
+    return os.path.join(store_folder, f"{session_id}.db")
+
+
+def write_session_store(path, resultado):
+    """Grava o resultado processado de uma sessão em um arquivo SQLite próprio"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    try:
+        # Arquivo novo e descartável até o rename: sem journal nem fsync por transação
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        frame = resultado['dados_processados'].frame.reset_index(drop=True)
+        frame.to_sql('registros', conn, index=False)
+        conn.execute("CREATE TABLE resultado (chave TEXT PRIMARY KEY, valor TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT INTO resultado (chave, valor) VALUES (?, ?)",
+            [(chave, json.dumps(resultado.get(chave, {}), ensure_ascii=False)) for chave in CHAVES_RESULTADO]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(temp_path, path)
+    return path
+
+
+def link_session_store(origem, destino):
+    """Arquivo de resultados para uma sessão que reaproveita os de outra (hard link, cópia se não suportado)"""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copyfile(origem, destino)
+    return destino
+
+
+def read_session_results(path, chaves=CHAVES_RESULTADO):
+    """Partes JSON do resultado (resumos, pacotes...) sem carregar os registros"""
+    chaves = list(chaves)
+    marcadores = ', '.join('?' * len(chaves))
+    with readonly_connection(path) as conn:
+        linhas = conn.execute(
+            f"SELECT chave, valor FROM resultado WHERE chave IN ({marcadores})", chaves
+        ).fetchall()
+    return {chave: json.loads(valor) for chave, valor in linhas}
+
+
+def load_session_store(path):
+    """Resultado completo no formato de process_faturamento"""
+    resultado = read_session_results(path)
+    with readonly_connection(path) as conn:
+        frame = pd.read_sql_query("SELECT * FROM registros", conn)
+    resultado['dados_processados'] = RegistrosProcessados(frame)
+    return resultado
+
+
+def remove_session_store(path):
+    """Remove o arquivo de resultados de uma sessão (O(1), sem tocar o banco da aplicação)"""
+    if not path:
+        return
+    discard(path)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,147 @@
+"""
+Conexões SQLite somente leitura para os arquivos de produção enviados
+
+Arquivos enviados nunca são alterados depois de salvos: dentro dos diretórios
+registrados como imutáveis as conexões usam a URI mode=ro&immutable=1 (sem locks nem
+verificação de alterações), mmap e cache maiores, e ficam em um pool por arquivo e
+por thread do worker. Demais caminhos são abertos apenas com mode=ro.
+
+Variáveis de ambiente:
+    SQLITE_MMAP_SIZE     bytes mapeados em memória (padrão 256 MB)
+    SQLITE_CACHE_KB      cache de páginas em KB (padrão 65536)
+    SQLITE_POOL_SIZE     conexões mantidas por thread (padrão 8)
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+
+MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+CACHE_KB = int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024))
+POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))
+
+_immutable_dirs = set()
+_local = threading.local()
+# Geração global: incrementada ao descartar arquivos para invalidar os pools de todas as threads.
+# _abertas conta as conexões de pool de cada arquivo (todas as threads); a geração de um arquivo
+# só é guardada enquanto houver conexão dele, então _discarded não cresce com cada arquivo removido.
+_discarded = {}
+_abertas = {}
+_discarded_lock = threading.Lock()
+
+
+def _reiniciar_apos_fork():
+    # Conexões herdadas não são usadas no processo filho (pools são por pid)
+    _discarded.clear()
+    _abertas.clear()
+
+
+os.register_at_fork(after_in_child=_reiniciar_apos_fork)
+
+
+def register_immutable_dir(path):
+    """Marca um diretório cujos arquivos nunca são modificados depois de gravados"""
+    _immutable_dirs.add(os.path.realpath(path))
+
+
+def is_immutable(path):
+    real = os.path.realpath(path)
+    return any(real.startswith(d + os.sep) for d in _immutable_dirs)
+
+
+def connect_readonly(path, immutable=None):
+    """Abre uma conexão somente leitura (sem pool) com PRAGMAs de leitura ajustados"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Arquivo SQLite não encontrado: {path}")
+    if immutable is None:
+        immutable = is_immutable(path)
+
+    uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _liberar(real):
+    with _discarded_lock:
+        restantes = _abertas.get(real, 1) - 1
+        if restantes > 0:
+            _abertas[real] = restantes
+        else:
+            # Nenhuma conexão do arquivo: a geração não tem mais o que invalidar
+            _abertas.pop(real, None)
+            _discarded.pop(real, None)
+
+
+def _fechar(chave, conn):
+    conn.close()
+    _liberar(chave[0])
+
+
+def _pool():
+    # Pool por thread e por processo (não reaproveitar conexões herdadas via fork)
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.pid = pid
+        _local.conns = OrderedDict()
+    conns = _local.conns
+    # discard() em outra thread só incrementa a geração: fecha aqui as conexões obsoletas
+    for chave in [c for c in conns if c[-1] != _discarded.get(c[0], 0)]:
+        _fechar(chave, conns.pop(chave))
+    return conns
+
+
+@contextmanager
+def readonly_connection(path):
+    """Conexão somente leitura reaproveitada por arquivo; imutáveis ficam no pool da thread"""
+    if not is_immutable(path):
+        conn = connect_readonly(path, immutable=False)
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    stat = os.stat(path)
+    real = os.path.realpath(path)
+    conns = _pool()
+    # Geração lida e conexão nova contada juntas: discard() concorrente sempre a enxerga
+    with _discarded_lock:
+        chave = (real, stat.st_ino, stat.st_size, stat.st_mtime_ns, _discarded.get(real, 0))
+        conn = conns.pop(chave, None)
+        if conn is None:
+            _abertas[real] = _abertas.get(real, 0) + 1
+    if conn is None:
+        try:
+            conn = connect_readonly(path, immutable=True)
+        except Exception:
+            _liberar(real)
+            raise
+    try:
+        yield conn
+    except Exception:
+        _fechar(chave, conn)
+        raise
+    else:
+        conns[chave] = conn
+        while len(conns) > POOL_SIZE:
+            _fechar(*conns.popitem(last=False))
+
+
+def discard(path):
+    """Invalida as conexões de um arquivo (antes de removê-lo ou substituí-lo)
+
+    As da thread atual são fechadas já; as das demais threads, no próximo uso do pool delas.
+    """
+    real = os.path.realpath(path)
+    with _discarded_lock:
+        if real in _abertas:
+            _discarded[real] = _discarded.get(real, 0) + 1
+    _pool()
@@ -550,6 +550,101 @@ function createDivinopolisComparisonChart(canvasId, data) {
     return chart;
 }
 
+/**
+ * Creates a horizontal bar chart of signed variations (increases green, decreases red)
+ * @param {string} canvasId - The ID of the canvas element
+ * @param {Object} data - Chart data with labels and data arrays (deltas)
+ * @param {string} title - Chart title
+ * @returns {Chart} Chart instance
+ */
+function createDeltaChart(canvasId, data, title = '') {
+    const ctx = document.getElementById(canvasId);
+    if (!ctx) {
+        console.error(`Canvas element with ID '${canvasId}' not found`);
+        return null;
+    }
+
+    // Destroy existing chart if it exists
+    if (ctx.chart) {
+        ctx.chart.destroy();
+    }
+
+    const values = data.data || [];
+    const colors = values.map(value => value < 0 ? '#dc3545' : '#28a745');
+
+    const config = {
+        type: 'bar',
+        data: {
+            labels: data.labels || [],
+            datasets: [{
+                label: title,
+                data: values,
+                backgroundColor: colors,
+                borderColor: colors,
+                borderWidth: 1,
+                borderRadius: 4
+            }]
+        },
+        options: {
+            indexAxis: 'y',
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                title: {
+                    display: !!title,
+                    text: title,
+                    font: {
+                        size: 16,
+                        weight: 'bold'
+                    },
+                    padding: 20
+                },
+                legend: {
+                    display: false
+                },
+                tooltip: {
+                    callbacks: {
+                        label: function(context) {
+                            const value = context.parsed.x || 0;
+                            const sign = value > 0 ? '+' : '';
+                            return `${context.label}: ${sign}${formatCurrency(value)}`;
+                        }
+                    }
+                }
+            },
+            scales: {
+                x: {
+                    grid: {
+                        color: 'rgba(255, 255, 255, 0.1)'
+                    },
+                    ticks: {
+                        callback: function(value) {
+                            return 'R$ ' + value.toLocaleString('pt-BR', {minimumFractionDigits: 0});
+                        },
+                        font: {
+                            size: 11
+                        }
+                    }
+                },
+                y: {
+                    grid: {
+                        display: false
+                    },
+                    ticks: {
+                        font: {
+                            size: 11
+                        }
+                    }
+                }
+            }
+        }
+    };
+
+    const chart = new Chart(ctx, config);
+    ctx.chart = chart;
+    return chart;
+}
+
 // Export functions for global use
 window.chartUtils = {
     createPieChart,
@@ -557,6 +652,7 @@ window.chartUtils = {
     createLineChart,
     createDoughnutChart,
     createDivinopolisComparisonChart,
+    createDeltaChart,
     formatCurrency,
     generateColors,
     destroyAllCharts,
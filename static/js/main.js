@@ -9,6 +9,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeFileUploads();
     initializeFormValidations();
     initializeDynamicContent();
+    initializePaginatedTables();
     initializeAnimations();
 });
 
@@ -359,22 +360,209 @@ function initializeStatusUpdates() {
  * @param {string} sessionId - Session ID
  * @param {HTMLElement} element - Element to update
  */
-async function checkSessionStatus(sessionId, element) {
-    try {
-        const response = await fetch(`/api/session-status/${sessionId}`);
-        if (response.ok) {
+function checkSessionStatus(sessionId, element) {
+    watchSessionStatus(sessionId, (data, finished) => {
+        updateStatusBadge(element, data.status);
+        if (finished) {
+            // Status changed, reload page to show updated content
+            window.location.reload();
+        }
+    });
+}
+
+/**
+ * Watch a session's processing status until it finishes
+ * Uses Server-Sent Events and falls back to long-polling when SSE is unavailable.
+ * @param {string|number} sessionId - Session ID
+ * @param {Function} onUpdate - Called with (data, finished) for each status/stage change
+ */
+function watchSessionStatus(sessionId, onUpdate) {
+    if (!window.EventSource) {
+        longPollSessionStatus(sessionId, onUpdate);
+        return;
+    }
+    
+    const source = new EventSource(`/api/session-events/${sessionId}`);
+    let received = false;
+    
+    source.addEventListener('status', event => {
+        received = true;
+        const data = JSON.parse(event.data);
+        if (data.status === 'processing') {
+            onUpdate(data, false);
+        }
+    });
+    source.addEventListener('done', event => {
+        source.close();
+        onUpdate(JSON.parse(event.data), true);
+    });
+    source.onerror = () => {
+        // Stream never opened (proxy buffering, blocked): switch to long-polling.
+        // After a successful open EventSource reconnects by itself.
+        if (!received) {
+            source.close();
+            longPollSessionStatus(sessionId, onUpdate);
+        }
+    };
+}
+
+/**
+ * Long-poll session status: the server holds each request until something changes
+ * @param {string|number} sessionId - Session ID
+ * @param {Function} onUpdate - Called with (data, finished)
+ */
+async function longPollSessionStatus(sessionId, onUpdate) {
+    let version = 0;
+    while (true) {
+        try {
+            const response = await fetch(`/api/session-status/${sessionId}?wait=25&version=${version}`, { cache: 'no-store' });
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
             const data = await response.json();
-            
-            if (data.status === 'completed' || data.status === 'error') {
-                // Status changed, reload page to show updated content
-                window.location.reload();
+            version = data.version;
+            const finished = data.status === 'completed' || data.status === 'error';
+            onUpdate(data, finished);
+            if (finished) {
+                return;
             }
+        } catch (error) {
+            console.error('Error checking session status:', error);
+            await new Promise(resolve => setTimeout(resolve, 5000));
         }
+    }
+}
+
+/**
+ * Initialize server-side paginated tables (table[data-paginated-url])
+ * Columns are declared with th[data-field]; clicking a header sorts by it.
+ */
+function initializePaginatedTables() {
+    document.querySelectorAll('table[data-paginated-url]').forEach(table => {
+        const state = {
+            url: table.dataset.paginatedUrl,
+            page: 1,
+            perPage: parseInt(table.dataset.perPage || '50'),
+            sort: table.dataset.sort || '',
+            order: table.dataset.order || 'asc'
+        };
+        const columns = Array.from(table.querySelectorAll('th[data-field]'));
+        
+        columns.forEach(th => {
+            th.style.cursor = 'pointer';
+            th.addEventListener('click', () => {
+                const field = th.dataset.field;
+                state.order = (state.sort === field && state.order === 'asc') ? 'desc' : 'asc';
+                state.sort = field;
+                state.page = 1;
+                loadTablePage(table, columns, state);
+            });
+        });
+        
+        loadTablePage(table, columns, state);
+    });
+}
+
+/**
+ * Load one page of a paginated table and render rows and pager
+ * @param {HTMLElement} table - Table element
+ * @param {Array} columns - Header cells with data-field
+ * @param {Object} state - Current page/sort state
+ */
+async function loadTablePage(table, columns, state) {
+    const tbody = table.querySelector('tbody');
+    const params = new URLSearchParams({ page: state.page, per_page: state.perPage });
+    if (state.sort) {
+        params.set('sort', state.sort);
+        params.set('order', state.order);
+    }
+    
+    tbody.innerHTML = `<tr><td colspan="${columns.length}" class="text-center text-muted">Carregando...</td></tr>`;
+    
+    try {
+        const response = await fetch(`${state.url}?${params}`);
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || response.statusText);
+        }
+        
+        tbody.innerHTML = data.items.map(item => '<tr>' + columns.map(th =>
+            `<td>${formatTableCell(item[th.dataset.field], th.dataset.format)}</td>`
+        ).join('') + '</tr>').join('');
+        
+        columns.forEach(th => {
+            th.classList.toggle('text-primary', th.dataset.field === data.sort);
+        });
+        
+        renderTablePager(table, columns, state, data);
     } catch (error) {
-        console.error('Error checking session status:', error);
+        console.error('Error loading table page:', error);
+        tbody.innerHTML = `<tr><td colspan="${columns.length}" class="text-center text-danger">Erro ao carregar dados</td></tr>`;
+    }
+}
+
+/**
+ * Render previous/next pager below a paginated table
+ */
+function renderTablePager(table, columns, state, data) {
+    const container = table.closest('.table-responsive') || table;
+    let pager = container.nextElementSibling;
+    if (!pager || !pager.classList.contains('table-pager')) {
+        pager = document.createElement('div');
+        pager.className = 'table-pager d-flex justify-content-between align-items-center mt-2';
+        container.after(pager);
+    }
+    
+    const pages = Math.max(data.pages, 1);
+    pager.innerHTML = `
+        <small class="text-muted">${data.total} registros &middot; página ${data.page} de ${pages}</small>
+        <div class="btn-group btn-group-sm">
+            <button type="button" class="btn btn-outline-secondary" data-page="${data.page - 1}" ${data.page <= 1 ? 'disabled' : ''}>Anterior</button>
+            <button type="button" class="btn btn-outline-secondary" data-page="${data.page + 1}" ${data.page >= pages ? 'disabled' : ''}>Próxima</button>
+        </div>`;
+    
+    pager.querySelectorAll('button[data-page]').forEach(button => {
+        button.addEventListener('click', () => {
+            state.page = parseInt(button.dataset.page);
+            loadTablePage(table, columns, state);
+        });
+    });
+}
+
+/**
+ * Format a table cell value
+ * @param {*} value - Raw value
+ * @param {string} format - currency | code | badge
+ * @returns {string} HTML
+ */
+function formatTableCell(value, format) {
+    if (value === null || value === undefined || value === '') {
+        return '-';
+    }
+    const text = escapeHtml(String(value));
+    switch (format) {
+        case 'currency':
+            return Number(value).toLocaleString('pt-BR', { style: 'currency', currency: 'BRL' });
+        case 'code':
+            return `<code>${text}</code>`;
+        case 'badge':
+            return `<span class="badge ${value === 'especial' ? 'bg-warning text-dark' : 'bg-secondary'}">${text}</span>`;
+        default:
+            return text;
     }
 }
 
+/**
+ * Escape HTML special characters
+ * @param {string} text - Text to escape
+ * @returns {string} Escaped text
+ */
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
 /**
  * Initialize animations
  */
@@ -523,6 +711,48 @@ async function copyToClipboard(text) {
     }
 }
 
+/**
+ * Fetch JSON honoring ETag: sends If-None-Match and reuses the cached body on 304
+ * Cached payloads are kept in sessionStorage so page reloads also revalidate.
+ * @param {string} url - URL to fetch
+ * @returns {Promise<Object>} Parsed JSON (throws on HTTP errors)
+ */
+async function fetchJSON(url) {
+    const cacheKey = `etag:${url}`;
+    let cached = null;
+    try {
+        cached = JSON.parse(sessionStorage.getItem(cacheKey));
+    } catch (error) {
+        cached = null;
+    }
+    
+    const headers = {};
+    if (cached && cached.etag) {
+        headers['If-None-Match'] = cached.etag;
+    }
+    
+    const response = await fetch(url, { headers, cache: 'no-store' });
+    if (response.status === 304 && cached) {
+        return cached.data;
+    }
+    
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || response.statusText);
+    }
+    
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        try {
+            sessionStorage.setItem(cacheKey, JSON.stringify({ etag, data }));
+        } catch (error) {
+            // Storage quota exceeded: continue without local cache
+            sessionStorage.removeItem(cacheKey);
+        }
+    }
+    return data;
+}
+
 /**
  * Debounce function to limit function calls
  * @param {Function} func - Function to debounce
@@ -548,6 +778,8 @@ window.saviUtils = {
     showToast,
     copyToClipboard,
     debounce,
+    fetchJSON,
+    watchSessionStatus,
     formatFileSize,
     clearFileInput
 };
@@ -0,0 +1,219 @@
+"""
+Teste de carga do banco da aplicação: leituras do dashboard durante escritas em lote
+
+Uso:
+    python stress_appdb.py --writers 2 --readers 4 --seconds 20
+    python stress_appdb.py --journal-mode DELETE    # comparação com o journal padrão
+
+Roda sobre uma cópia de instance/savi_assistant.db em um diretório temporário (o banco
+real nunca é alterado). Cada escritor e cada leitor é um processo separado, como os
+workers do gunicorn, e usa o engine configurado por create_app. Os escritores inserem
+ProcessedData em lotes; os leitores executam as consultas do dashboard e medem a
+latência. Sai com código 1 se alguma operação falhar ou o p95 das leituras passar de
+--max-p95-ms.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+DEFAULT_DB_PATH = os.path.join('instance', 'savi_assistant.db')
+
+
+def _abrir_app(workdir, journal_mode):
+    """Importa o app Flask apontando para a cópia do banco em workdir"""
+    os.chdir(workdir)
+    os.environ['SQLITE_JOURNAL_MODE'] = journal_mode
+    from app import app
+    return app
+
+
+def _preparar(workdir, journal_mode):
+    """Cria o usuário e a sessão que recebem as escritas; retorna (user_id, session_id)"""
+    app = _abrir_app(workdir, journal_mode)
+    from app import db
+    from models import AnalysisSession, User
+
+    with app.app_context():
+        user = User.query.filter_by(username='admin').first()
+        session = AnalysisSession(user_id=user.id, database_filename='stress.db', status='processing')
+        db.session.add(session)
+        db.session.commit()
+        ids = (user.id, session.id)
+        db.engine.dispose()
+    return ids
+
+
+def _linhas(session_id, quantidade):
+    inicio = date(2024, 1, 1)
+    for i in range(quantidade):
+        valor = round(random.uniform(20, 500), 2)
+        yield {
+            'session_id': session_id,
+            'empresa': random.choice(('DIVINOPOLIS', 'BELO HORIZONTE', 'CONTAGEM')),
+            'procedimento_nome': f"PROCEDIMENTO {random.randint(1, 40)}",
+            'procedimento_codigo': str(random.randint(10000, 99999)),
+            'medico_nome': f"MEDICO {random.randint(1, 25)}",
+            'usuario_nome': f"PACIENTE {random.randint(1, 5000)}",
+            'usuario_codigo': str(random.randint(1, 5000)),
+            'valor_original': valor,
+            'valor_final': valor,
+            'data_execucao': inicio + timedelta(days=i % 365),
+            'is_pacote': False,
+            'has_inconsistencia': False,
+        }
+
+
+def _escritor(workdir, journal_mode, session_id, lote, fim, fila):
+    app = _abrir_app(workdir, journal_mode)
+    from sqlalchemy import insert
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from models import ProcessedData
+
+    resultado = {'tipo': 'escritor', 'linhas': 0, 'lotes': 0, 'erros': 0, 'duracoes': []}
+    with app.app_context():
+        while time.time() < fim:
+            inicio = time.perf_counter()
+            try:
+                db.session.execute(insert(ProcessedData), list(_linhas(session_id, lote)))
+                db.session.commit()
+                resultado['linhas'] += lote
+                resultado['lotes'] += 1
+            except OperationalError:
+                db.session.rollback()
+                resultado['erros'] += 1
+            resultado['duracoes'].append((time.perf_counter() - inicio) * 1000)
+    fila.put(resultado)
+
+
+def _leitor(workdir, journal_mode, user_id, session_id, fim, fila):
+    app = _abrir_app(workdir, journal_mode)
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from models import AnalysisSession, ProcessedData
+
+    resultado = {'tipo': 'leitor', 'erros': 0, 'duracoes': []}
+    with app.app_context():
+        while time.time() < fim:
+            inicio = time.perf_counter()
+            try:
+                # Mesmas consultas do dashboard e da API de gráficos por sessão
+                AnalysisSession.query.filter_by(user_id=user_id)\
+                    .order_by(AnalysisSession.created_at.desc()).limit(5).all()
+                AnalysisSession.query.filter_by(user_id=user_id).count()
+                AnalysisSession.query.filter_by(user_id=user_id, status='completed').count()
+                db.session.query(
+                    ProcessedData.empresa,
+                    db.func.sum(ProcessedData.valor_final).label('total')
+                ).filter_by(session_id=session_id).group_by(ProcessedData.empresa).all()
+                db.session.rollback()
+            except OperationalError:
+                db.session.rollback()
+                resultado['erros'] += 1
+            resultado['duracoes'].append((time.perf_counter() - inicio) * 1000)
+    fila.put(resultado)
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def copiar_banco(origem, destino):
+    """Copia consistente do banco (API de backup, inclui o conteúdo do WAL)"""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    src = sqlite3.connect(f"file:{os.path.abspath(origem)}?mode=ro", uri=True)
+    dst = sqlite3.connect(destino)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def executar(db_path, writers, readers, seconds, lote, journal_mode, keep=False):
+    workdir = tempfile.mkdtemp(prefix='savi_stress_')
+    try:
+        copiar_banco(db_path, os.path.join(workdir, 'instance', 'savi_assistant.db'))
+        ctx = multiprocessing.get_context('spawn')
+
+        # Preparação em processo separado para não herdar conexões
+        with ctx.Pool(1) as pool:
+            user_id, session_id = pool.apply(_preparar, (workdir, journal_mode))
+
+        fila = ctx.Queue()
+        # Margem para os processos importarem o app antes da janela de medição
+        fim = time.time() + 5 + seconds
+        processos = [ctx.Process(target=_escritor, args=(workdir, journal_mode, session_id, lote, fim, fila))
+                     for _ in range(writers)]
+        processos += [ctx.Process(target=_leitor, args=(workdir, journal_mode, user_id, session_id, fim, fila))
+                      for _ in range(readers)]
+        for processo in processos:
+            processo.start()
+        resultados = [fila.get() for _ in processos]
+        for processo in processos:
+            processo.join()
+    finally:
+        if keep:
+            print(f"Banco de teste mantido em {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    leituras = [d for r in resultados if r['tipo'] == 'leitor' for d in r['duracoes']]
+    escritas = [d for r in resultados if r['tipo'] == 'escritor' for d in r['duracoes']]
+    return {
+        'journal_mode': journal_mode,
+        'linhas_escritas': sum(r.get('linhas', 0) for r in resultados),
+        'lotes': sum(r.get('lotes', 0) for r in resultados),
+        'erros_escrita': sum(r['erros'] for r in resultados if r['tipo'] == 'escritor'),
+        'erros_leitura': sum(r['erros'] for r in resultados if r['tipo'] == 'leitor'),
+        'leituras': len(leituras),
+        'leitura_p50_ms': percentil(leituras, 50),
+        'leitura_p95_ms': percentil(leituras, 95),
+        'leitura_max_ms': max(leituras, default=0.0),
+        'escrita_p95_ms': percentil(escritas, 95),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Leituras do dashboard durante escritas concorrentes no banco da aplicação')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='banco de origem (copiado, não alterado)')
+    parser.add_argument('--writers', type=int, default=2, help='processos escritores')
+    parser.add_argument('--readers', type=int, default=4, help='processos leitores')
+    parser.add_argument('--seconds', type=float, default=15, help='duração da medição')
+    parser.add_argument('--batch', type=int, default=2000, help='linhas de ProcessedData por transação')
+    parser.add_argument('--journal-mode', default='WAL', help='journal_mode do SQLite (WAL, DELETE...)')
+    parser.add_argument('--max-p95-ms', type=float, default=500, help='limite de p95 das leituras')
+    parser.add_argument('--keep', action='store_true', help='não remover o banco de teste')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"Banco não encontrado: {args.db}")
+
+    r = executar(os.path.abspath(args.db), args.writers, args.readers, args.seconds,
+                 args.batch, args.journal_mode.upper(), args.keep)
+
+    print(f"journal_mode={r['journal_mode']}  escritores={args.writers}  leitores={args.readers}")
+    print(f"escritas: {r['linhas_escritas']} linhas em {r['lotes']} lotes "
+          f"(p95 {r['escrita_p95_ms']:.1f} ms), {r['erros_escrita']} erros")
+    print(f"leituras: {r['leituras']}  p50 {r['leitura_p50_ms']:.1f} ms  "
+          f"p95 {r['leitura_p95_ms']:.1f} ms  max {r['leitura_max_ms']:.1f} ms, {r['erros_leitura']} erros")
+
+    ok = (r['erros_escrita'] == 0 and r['erros_leitura'] == 0
+          and r['leitura_p95_ms'] <= args.max_p95_ms)
+    print('OK' if ok else 'FALHOU')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Limpeza em segundo plano da pasta de uploads
+
+Arquivos referenciados por alguma AnalysisSession nunca são removidos. Os demais saem
+quando ficam sem acesso por mais de UPLOAD_MAX_IDLE_HOURS ou, se a pasta passar de
+UPLOAD_QUOTA_BYTES, em ordem de último acesso (LRU) até voltar à cota.
+
+O último acesso é o atime do arquivo, atualizado explicitamente por touch_upload (no
+máximo a cada TOUCH_INTERVAL segundos por arquivo); o mtime é preservado porque faz
+parte das chaves de cache (pool SQLite, artefatos da sessão, ETags).
+
+A limpeza roda em uma thread por worker, iniciada na primeira requisição; um flock em
+uploads/.janitor.lock garante uma única execução por vez entre os workers.
+"""
+
+import fcntl
+import logging
+import os
+import threading
+import time
+
+from sqlite_pool import discard, is_immutable
+
+logger = logging.getLogger(__name__)
+
+TOUCH_INTERVAL = 300
+LOCK_FILENAME = '.janitor.lock'
+
+_touched = {}
+_touched_lock = threading.Lock()
+
+
+def touch_upload(path, force=False):
+    """Registra acesso a um arquivo enviado (atime), preservando o mtime"""
+    if not path or not is_immutable(path):
+        return
+    agora = time.time()
+    real = os.path.realpath(path)
+    with _touched_lock:
+        if not force and agora - _touched.get(real, 0) < TOUCH_INTERVAL:
+            return
+        _touched[real] = agora
+    try:
+        stat = os.stat(real)
+        os.utime(real, ns=(int(agora * 1e9), stat.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def last_access(stat):
+    return max(stat.st_atime, stat.st_mtime)
+
+
+def scan_uploads(upload_folder):
+    """Arquivos da pasta de uploads: [(caminho real, tamanho, último acesso)] e bytes totais"""
+    arquivos = []
+    total = 0
+    for entry in os.scandir(upload_folder):
+        if entry.is_dir(follow_symlinks=False):
+            # Partes de uploads em andamento contam para a cota mas não são despejadas aqui
+            for raiz, _, nomes in os.walk(entry.path):
+                total += sum(os.path.getsize(os.path.join(raiz, nome)) for nome in nomes)
+            continue
+        if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+            continue
+        stat = entry.stat()
+        total += stat.st_size
+        arquivos.append((os.path.realpath(entry.path), stat.st_size, last_access(stat)))
+    return arquivos, total
+
+
+def _remove(path):
+    discard(path)
+    os.remove(path)
+
+
+def run_janitor(upload_folder, referenced, quota_bytes, max_idle_seconds, grace_seconds, now=None):
+    """Uma passada de limpeza; referenced = caminhos (reais) usados por sessões"""
+    now = now or time.time()
+    arquivos, total = scan_uploads(upload_folder)
+    relatorio = {'removidos': [], 'liberados': 0, 'total_antes': total,
+                 'referenciados': sum(tamanho for path, tamanho, _ in arquivos if path in referenced)}
+
+    candidatos = sorted(
+        (acesso, path, tamanho) for path, tamanho, acesso in arquivos
+        if path not in referenced and now - acesso > grace_seconds
+    )
+    for acesso, path, tamanho in candidatos:
+        ocioso = max_idle_seconds and now - acesso > max_idle_seconds
+        if not ocioso and total <= quota_bytes:
+            break
+        try:
+            # Acesso pode ter ocorrido desde a varredura (ex.: upload idêntico reaproveitou o arquivo)
+            if now - last_access(os.stat(path)) <= grace_seconds:
+                continue
+            _remove(path)
+        except FileNotFoundError:
+            continue
+        total -= tamanho
+        relatorio['removidos'].append(os.path.basename(path))
+        relatorio['liberados'] += tamanho
+
+    relatorio['total_depois'] = total
+    if total > quota_bytes:
+        logger.warning("Pasta de uploads acima da cota apenas com arquivos em uso: %d de %d bytes",
+                       total, quota_bytes)
+    return relatorio
+
+
+def referenced_paths():
+    """Caminhos (reais) de banco e planilha usados por alguma sessão"""
+    from models import AnalysisSession
+
+    caminhos = set()
+    for db_path, excel_path in AnalysisSession.query.with_entities(
+            AnalysisSession.db_file_path, AnalysisSession.excel_file_path):
+        caminhos.update(os.path.realpath(p) for p in (db_path, excel_path) if p)
+    return caminhos
+
+
+def janitor_pass(app):
+    """Executa uma limpeza com a configuração do app (None se outro worker já está executando)"""
+    from chunked_upload import remove_stale_uploads
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+    with open(os.path.join(upload_folder, LOCK_FILENAME), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        try:
+            max_idle_seconds = app.config['UPLOAD_MAX_IDLE_HOURS'] * 3600
+            remove_stale_uploads(upload_folder, max_idle_seconds)
+            with app.app_context():
+                referenced = referenced_paths()
+            relatorio = run_janitor(upload_folder, referenced, app.config['UPLOAD_QUOTA_BYTES'],
+                                    max_idle_seconds, app.config['UPLOAD_GRACE_SECONDS'])
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    if relatorio['removidos']:
+        logger.info("Limpeza de uploads: %d arquivos removidos, %d bytes liberados",
+                    len(relatorio['removidos']), relatorio['liberados'])
+    return relatorio
+
+
+def init_upload_janitor(app):
+    """Inicia a thread de limpeza na primeira requisição de cada processo (seguro com fork)"""
+    if not app.config['UPLOAD_JANITOR_ENABLED']:
+        return
+    interval = app.config['UPLOAD_JANITOR_INTERVAL_SECONDS']
+    estado = {'pid': None}
+    estado_lock = threading.Lock()
+
+    def loop():
+        while True:
+            try:
+                janitor_pass(app)
+            except Exception as e:
+                logger.error("Erro na limpeza de uploads: %s", e)
+            time.sleep(interval)
+
+    @app.before_request
+    def _start_janitor():
+        if estado['pid'] == os.getpid():
+            return
+        with estado_lock:
+            if estado['pid'] != os.getpid():
+                estado['pid'] = os.getpid()
+                threading.Thread(target=loop, name='upload-janitor', daemon=True).start()
@@ -0,0 +1,162 @@
+"""
+Validação rápida dos arquivos enviados (banco SQLite de produção e planilha de carteirinhas)
+
+Nada aqui percorre a tabela ou a planilha inteira: o banco é verificado com consultas
+EXISTS/LIMIT 1 e sondagens por rowid (contagem aproximada por max(rowid) e período por
+amostra de linhas); PRAGMA quick_check é opcional. A planilha é lida em modo read-only
+(streaming), apenas cabeçalho e primeira linha de dados.
+"""
+
+import os
+import random
+import time
+from datetime import datetime
+
+import openpyxl
+
+from sqlite_pool import readonly_connection
+
+COLUNAS_PRODUCAO = (
+    'empresa', 'servico', 'rede', 'data_execucao', 'usuario_codigo', 'usuario_nome',
+    'medico_codigo', 'medico_nome', 'procedimento_codigo', 'procedimento_nome',
+    'urgencia', 'qtde_autorizada', 'qtde_realizada', 'data_autorizacao', 'numero_guia', 'senha',
+)
+
+FORMATO_DATA = '%d/%m/%Y'
+AMOSTRAS_DATA = 256
+
+
+def _relatorio(tipo):
+    return {'tipo': tipo, 'valido': False, 'erros': [], 'avisos': []}
+
+
+def _finalizar(relatorio, inicio):
+    relatorio['valido'] = not relatorio['erros']
+    relatorio['duracao_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+    return relatorio
+
+
+def _amostra_datas(cursor, max_rowid, amostras=AMOSTRAS_DATA):
+    """Período aproximado de data_execucao a partir de linhas espalhadas pelo rowid"""
+    datas = []
+    invalidas = 0
+    # Posições pseudoaleatórias (determinísticas) evitam coincidir com padrões periódicos do arquivo
+    rng = random.Random(max_rowid)
+    alvos = {1, max_rowid} | {rng.randint(1, max_rowid) for _ in range(min(amostras, max_rowid))}
+    for alvo in sorted(alvos):
+        linha = cursor.execute(
+            "SELECT data_execucao FROM producao WHERE rowid >= ? ORDER BY rowid LIMIT 1", (alvo,)
+        ).fetchone()
+        if not linha or not linha[0]:
+            continue
+        try:
+            datas.append(datetime.strptime(str(linha[0]).strip(), FORMATO_DATA).date())
+        except ValueError:
+            invalidas += 1
+    return datas, invalidas
+
+
+def inspect_sqlite(filepath, quick_check=False):
+    """Relatório estrutural do banco de produção (schema, linhas aproximadas, período)"""
+    inicio = time.perf_counter()
+    relatorio = _relatorio('sqlite')
+    relatorio['tamanho_bytes'] = os.path.getsize(filepath)
+    try:
+        with readonly_connection(filepath) as conn:
+            cursor = conn.cursor()
+            tabelas = [row[0] for row in cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+            relatorio['tabelas'] = tabelas
+
+            if quick_check:
+                resultado = cursor.execute("PRAGMA quick_check(1)").fetchone()[0]
+                relatorio['quick_check'] = resultado
+                if resultado != 'ok':
+                    relatorio['erros'].append(f"Banco corrompido: {resultado}")
+
+            if 'producao' not in tabelas:
+                relatorio['erros'].append("Tabela 'producao' não encontrada no banco de dados")
+                return _finalizar(relatorio, inicio)
+
+            colunas = [row[1] for row in cursor.execute("PRAGMA table_info(producao)")]
+            relatorio['colunas'] = colunas
+            faltando = [col for col in COLUNAS_PRODUCAO if col not in colunas]
+            if faltando:
+                relatorio['erros'].append(f"Colunas obrigatórias não encontradas: {', '.join(faltando)}")
+
+            if not cursor.execute("SELECT EXISTS(SELECT 1 FROM producao LIMIT 1)").fetchone()[0]:
+                relatorio['linhas_aprox'] = 0
+                relatorio['erros'].append("Tabela 'producao' está vazia")
+                return _finalizar(relatorio, inicio)
+
+            # max(rowid) é uma busca na B-tree; difere da contagem apenas se houve exclusões
+            try:
+                max_rowid = cursor.execute("SELECT max(rowid) FROM producao").fetchone()[0] or 0
+            except Exception:
+                max_rowid = 0
+            relatorio['linhas_aprox'] = max_rowid or None
+
+            if max_rowid and 'data_execucao' in colunas:
+                datas, invalidas = _amostra_datas(cursor, max_rowid)
+                relatorio['data_inicio'] = min(datas).strftime(FORMATO_DATA) if datas else None
+                relatorio['data_fim'] = max(datas).strftime(FORMATO_DATA) if datas else None
+                if invalidas:
+                    relatorio['avisos'].append(
+                        f"{invalidas} de {len(datas) + invalidas} datas amostradas fora do formato dd/mm/aaaa")
+    except Exception as e:
+        relatorio['erros'].append(f"Erro ao validar banco: {str(e)}")
+
+    return _finalizar(relatorio, inicio)
+
+
+def inspect_excel(filepath):
+    """Relatório da planilha de carteirinhas lendo só o cabeçalho e a primeira linha"""
+    inicio = time.perf_counter()
+    relatorio = _relatorio('excel')
+    relatorio['tamanho_bytes'] = os.path.getsize(filepath)
+    try:
+        workbook = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            worksheet = workbook.active
+            relatorio['planilha'] = worksheet.title
+            linhas = worksheet.iter_rows(min_row=1, max_row=2, values_only=True)
+            cabecalho = next(linhas, None)
+            primeira = next(linhas, None)
+
+            colunas = [str(valor).strip() for valor in (cabecalho or ()) if valor is not None]
+            relatorio['colunas'] = colunas
+            # Dimensão declarada no arquivo (pode faltar em planilhas geradas por outras ferramentas)
+            max_row = worksheet.max_row
+            relatorio['linhas_aprox'] = max_row - 1 if max_row else None
+
+            if not cabecalho or cabecalho[0] is None:
+                relatorio['erros'].append("Planilha deve conter cabeçalhos")
+            elif primeira is None or all(valor is None for valor in primeira):
+                relatorio['erros'].append("Planilha está vazia")
+            elif 'usuario_codigo' not in colunas:
+                relatorio['avisos'].append("Coluna 'usuario_codigo' não encontrada; carteirinhas especiais serão ignoradas")
+        finally:
+            workbook.close()
+    except Exception as e:
+        relatorio['erros'].append(f"Erro ao validar planilha: {str(e)}")
+
+    return _finalizar(relatorio, inicio)
+
+
+def inspect_file(filepath, file_type='db', quick_check=False):
+    if file_type == 'db':
+        return inspect_sqlite(filepath, quick_check=quick_check)
+    return inspect_excel(filepath)
+
+
+def summarize(relatorio):
+    """Mensagem curta (para flash/log) a partir do relatório"""
+    if relatorio['erros']:
+        return relatorio['erros'][0]
+    if relatorio['tipo'] == 'sqlite':
+        mensagem = f"Banco válido com ~{relatorio['linhas_aprox'] or 0} registros"
+        if relatorio.get('data_inicio'):
+            mensagem += f" ({relatorio['data_inicio']} a {relatorio['data_fim']})"
+        return mensagem
+    linhas = relatorio.get('linhas_aprox')
+    return f"Planilha válida com {linhas} registros" if linhas is not None else "Planilha válida"
@@ -1,9 +1,10 @@
 import os
 import uuid
+import hashlib
 from werkzeug.utils import secure_filename
 from flask import current_app
-import sqlite3
-import openpyxl
+from upload_janitor import janitor_pass, touch_upload
+from upload_validation import inspect_file, inspect_sqlite, inspect_excel, summarize
 import logging
 
 ALLOWED_DB_EXTENSIONS = {'db', 'sqlite', 'sqlite3'}
@@ -17,70 +18,62 @@ def allowed_excel_file(filename):
     """Permite qualquer arquivo para Excel"""
     return True  # Permitir qualquer arquivo
 
-def validate_sqlite_file(filepath):
+def validate_sqlite_file(filepath, quick_check=False):
     """Valida se o arquivo SQLite é válido e contém a tabela producao"""
-    try:
-        conn = sqlite3.connect(filepath)
-        cursor = conn.cursor()
-        
-        # Verificar se a tabela producao existe
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='producao'")
-        if not cursor.fetchone():
-            conn.close()
-            return False, "Tabela 'producao' não encontrada no banco de dados"
-        
-        # Verificar se a tabela tem as colunas necessárias
-        cursor.execute("PRAGMA table_info(producao)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        required_columns = [
-            'empresa', 'servico', 'rede', 'data_execucao', 'usuario_codigo', 'usuario_nome',
-            'medico_codigo', 'medico_nome', 'procedimento_codigo', 'procedimento_nome',
-            'urgencia', 'qtde_autorizada', 'qtde_realizada', 'data_autorizacao', 'numero_guia', 'senha'
-        ]
-        
-        missing_columns = [col for col in required_columns if col not in columns]
-        if missing_columns:
-            conn.close()
-            return False, f"Colunas obrigatórias não encontradas: {', '.join(missing_columns)}"
-        
-        # Verificar se há dados na tabela
-        cursor.execute("SELECT COUNT(*) FROM producao")
-        count = cursor.fetchone()[0]
-        conn.close()
-        
-        if count == 0:
-            return False, "Tabela 'producao' está vazia"
-        
-        return True, f"Banco válido com {count} registros"
-    
-    except Exception as e:
-        return False, f"Erro ao validar banco: {str(e)}"
+    relatorio = inspect_sqlite(filepath, quick_check=quick_check)
+    return relatorio['valido'], summarize(relatorio)
 
 def validate_excel_file(filepath):
     """Valida se o arquivo Excel é válido"""
+    relatorio = inspect_excel(filepath)
+    return relatorio['valido'], summarize(relatorio)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def store_upload_stream(stream, filename, upload_folder):
+    """Grava o stream em blocos calculando o SHA-256; arquivo final nomeado pelo hash
+    
+    Retorna (caminho, sha256, reaproveitado). Conteúdo já existente não é regravado.
+    """
+    sha = hashlib.sha256()
+    temp_path = os.path.join(upload_folder, f".{uuid.uuid4().hex}.part")
     try:
-        workbook = openpyxl.load_workbook(filepath)
-        worksheet = workbook.active
+        with open(temp_path, 'wb') as destino:
+            for bloco in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b''):
+                sha.update(bloco)
+                destino.write(bloco)
         
-        # Verificar se há dados
-        if hasattr(worksheet, 'max_row') and worksheet.max_row <= 1:
-            return False, "Planilha está vazia"
-        
-        # Verificar se há coluna usuario_codigo (assumindo que esteja na primeira coluna)
-        if hasattr(worksheet, 'cell') and not worksheet.cell(row=1, column=1).value:
-            return False, "Planilha deve conter cabeçalhos"
-        
-        max_row = worksheet.max_row if hasattr(worksheet, 'max_row') else 0
-        return True, f"Planilha válida com {max_row - 1} registros"
-    
-    except Exception as e:
-        return False, f"Erro ao validar planilha: {str(e)}"
+        digest = sha.hexdigest()
+        extensao = os.path.splitext(secure_filename(filename))[1].lower()
+        filepath = os.path.join(upload_folder, f"{digest}{extensao}")
+        if os.path.exists(filepath):
+            os.remove(temp_path)
+            # Conta como acesso: protege o arquivo da limpeza até a sessão referenciá-lo
+            touch_upload(filepath, force=True)
+            return filepath, digest, True
+        os.replace(temp_path, filepath)
+        return filepath, digest, False
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def validate_uploaded_file(filepath, file_type='db'):
+    """Mensagem de validação de um arquivo já salvo (arquivos inválidos são mantidos)"""
+    # Tentar validar arquivo salvo, mas não falhar se não conseguir
+    try:
+        relatorio = inspect_file(filepath, file_type, quick_check=current_app.config['UPLOAD_QUICK_CHECK'])
+        logging.info(f"Validação de {os.path.basename(filepath)} em {relatorio['duracao_ms']} ms: {summarize(relatorio)}")
+        if not relatorio['valido']:
+            return f"Aviso: {summarize(relatorio)}. O arquivo foi salvo mesmo assim."
+        return summarize(relatorio)
+    except:
+        return "Arquivo salvo (validação pulada)" if file_type == 'db' else "Arquivo Excel salvo (validação pulada)"
 
 def save_uploaded_file(file, file_type='db'):
-    """Salva arquivo enviado e retorna o caminho"""
+    """Salva arquivo enviado (endereçado pelo SHA-256) e retorna (caminho, mensagem, sha256)"""
     if not file or file.filename == '':
-        return None, "Nenhum arquivo selecionado"
+        return None, "Nenhum arquivo selecionado", None
     
     # Pular validação de extensão - permitir qualquer arquivo
     # if file_type == 'db' and not allowed_db_file(file.filename):
@@ -89,54 +82,21 @@ def save_uploaded_file(file, file_type='db'):
     # if file_type == 'excel' and not allowed_excel_file(file.filename):
     #     return None, "Tipo de arquivo não permitido. Use .xlsx ou .xls"
     
-    # Gerar nome único para o arquivo
-    filename = secure_filename(file.filename)
-    unique_filename = f"{uuid.uuid4().hex}_{filename}"
-    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-    
     try:
-        file.save(filepath)
-        
-        # Tentar validar arquivo salvo, mas não falhar se não conseguir
-        if file_type == 'db':
-            try:
-                is_valid, message = validate_sqlite_file(filepath)
-                if not is_valid:
-                    message = f"Aviso: {message}. O arquivo foi salvo mesmo assim."
-            except:
-                message = "Arquivo salvo (validação pulada)"
-        else:
-            try:
-                is_valid, message = validate_excel_file(filepath)
-                if not is_valid:
-                    message = f"Aviso: {message}. O arquivo foi salvo mesmo assim."
-            except:
-                message = "Arquivo Excel salvo (validação pulada)"
+        filepath, digest, reaproveitado = store_upload_stream(
+            file.stream, file.filename, current_app.config['UPLOAD_FOLDER'])
+        if reaproveitado:
+            logging.info(f"Arquivo {file.filename} já armazenado como {os.path.basename(filepath)}")
         
-        return filepath, message
+        return filepath, validate_uploaded_file(filepath, file_type), digest
     
     except Exception as e:
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        return None, f"Erro ao salvar arquivo: {str(e)}"
+        return None, f"Erro ao salvar arquivo: {str(e)}", None
 
-def cleanup_old_files(max_age_hours=24):
-    """Remove arquivos antigos da pasta de upload"""
+def cleanup_old_files():
+    """Executa agora a limpeza da pasta de upload (arquivos usados por sessões são mantidos)"""
     try:
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        import time
-        
-        current_time = time.time()
-        max_age_seconds = max_age_hours * 3600
-        
-        for filename in os.listdir(upload_folder):
-            filepath = os.path.join(upload_folder, filename)
-            if os.path.isfile(filepath):
-                file_age = current_time - os.path.getctime(filepath)
-                if file_age > max_age_seconds:
-                    os.remove(filepath)
-                    logging.info(f"Arquivo removido: {filename}")
-    
+        return janitor_pass(current_app._get_current_object())
     except Exception as e:
         logging.error(f"Erro na limpeza de arquivos: {e}")
 